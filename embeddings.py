@@ -0,0 +1,358 @@
+"""
+Sentence encoders for the embedding engine, and an on-disk cache for their output.
+
+An encoder has an encoder_id (identifying the model and its settings), a dimension,
+and encode(texts), which returns one L2-normalized float32 row per text.
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import tempfile
+import time
+import zlib
+
+try:
+    import numpy as np
+except ImportError:  # only needed once an encoder is created
+    np = None
+
+
+def normalize_rows(vectors):
+    """
+    Scale every row of a matrix to unit length, leaving all-zero rows untouched.
+    
+    Args:
+        vectors (numpy.ndarray): 2-D array
+        
+    Returns:
+        numpy.ndarray: float32 array with L2-normalized rows
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class HashingEncoder:
+    """
+    Deterministic feature-hashing encoder for offline use and testing.
+    
+    Words and padded character n-grams are hashed with CRC32 into a fixed number of
+    signed buckets. It captures no meaning beyond shared words and spelling, but it
+    needs no model download and gives the same vectors in every process.
+    """
+    
+    def __init__(self, dimension=256, char_ngrams=3):
+        """
+        Create the encoder.
+        
+        Args:
+            dimension (int): Length of the produced vectors
+            char_ngrams (int): Length of the hashed character n-grams, or 0 for words only
+        """
+        if np is None:
+            raise ImportError("HashingEncoder requires numpy (pip install numpy)")
+        self.dimension = dimension
+        self.char_ngrams = char_ngrams
+        self.encoder_id = f"hashing-{dimension}-{char_ngrams}"
+    
+    def _features(self, text):
+        """
+        Yield the words and character n-grams of a text.
+        """
+        for word in text.split():
+            yield "w:" + word
+        if self.char_ngrams:
+            padded = f" {text} "
+            for start in range(len(padded) - self.char_ngrams + 1):
+                yield "c:" + padded[start:start + self.char_ngrams]
+    
+    def encode(self, texts):
+        """
+        Encode a list of preprocessed texts.
+        
+        Args:
+            texts (list): Texts to encode
+            
+        Returns:
+            numpy.ndarray: float32 array of shape (len(texts), dimension)
+        """
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = zlib.crc32(feature.encode("utf-8"))
+                # The top bit picks the sign so colliding features tend to cancel out
+                sign = 1.0 if digest & 0x80000000 else -1.0
+                vectors[row, digest % self.dimension] += sign
+        return normalize_rows(vectors)
+
+
+class SentenceTransformerEncoder:
+    """
+    Encoder backed by a sentence-transformers model (see README for installation).
+    """
+    
+    def __init__(self, model_name="all-MiniLM-L6-v2"):
+        """
+        Load the model.
+        
+        Args:
+            model_name (str): Name or path of a sentence-transformers model
+        """
+        from sentence_transformers import SentenceTransformer
+        
+        self.model = SentenceTransformer(model_name)
+        self.dimension = self.model.get_sentence_embedding_dimension()
+        self.encoder_id = f"sentence-transformers/{model_name}"
+    
+    def encode(self, texts):
+        """
+        Encode a list of preprocessed texts.
+        
+        Args:
+            texts (list): Texts to encode
+            
+        Returns:
+            numpy.ndarray: float32 array of shape (len(texts), dimension)
+        """
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        vectors = self.model.encode(list(texts), convert_to_numpy=True)
+        return normalize_rows(vectors)
+
+
+class EmbeddingCache:
+    """
+    On-disk cache of question embeddings keyed by a hash of (encoder id, text).
+    
+    Every encoder gets its own manifest in the cache directory: a JSON file listing
+    immutable .npy segments, memory-mapped on load, and mapping keys to rows in
+    them. flush() writes only the new rows as a fresh segment under a unique name
+    and then atomically replaces the manifest, so vectors and keys always change
+    together, and several processes can share the directory: a writer merges the
+    latest manifest before replacing it, and a mapped segment is never rewritten.
+    A restart (or add_qa_pair) only encodes questions that are new or have changed.
+    Merges are size-tiered: a new segment is only merged with the small segments
+    written after the last much larger one, so every row is rewritten a logarithmic
+    number of times and the number of segments stays logarithmic in the row count.
+    """
+    
+    # A segment is merged into the next older one unless that one holds more than this
+    # many times the rows of all the segments after it
+    MERGE_RATIO = 2
+    # Seconds to wait for another writer, after which its lock is considered stale
+    LOCK_TIMEOUT = 10.0
+    
+    def __init__(self, directory, encoder):
+        """
+        Open (or create) the cache for one encoder.
+        
+        Args:
+            directory (str): Directory holding the cache files
+            encoder (object): Encoder whose output is cached
+        """
+        self.directory = directory
+        self.encoder = encoder
+        self._prefix = "embeddings-" + hashlib.sha1(encoder.encoder_id.encode("utf-8")).hexdigest()[:16]
+        self._manifest_path = os.path.join(directory, self._prefix + ".json")
+        self.hits = 0
+        self.misses = 0
+        self._load()
+    
+    def _read_manifest(self):
+        """
+        Read the manifest and memory-map its segments.
+        
+        Returns:
+            tuple: (segment names, mapped segments, key -> [segment, row]); rows of
+                   missing or mismatched segments are left out
+        """
+        if not os.path.exists(self._manifest_path):
+            return [], [], {}
+        try:
+            with open(self._manifest_path, 'r', encoding='utf-8') as file:
+                manifest = json.load(file)
+            names = list(manifest["segments"])
+            rows = manifest["rows"]
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Ignoring unreadable embedding cache: {e}")
+            return [], [], {}
+        
+        segments = []
+        for name in names:
+            try:
+                vectors = np.load(os.path.join(self.directory, name), mmap_mode='r')
+            except (OSError, ValueError):
+                vectors = None
+            if vectors is not None and (vectors.ndim != 2 or vectors.shape[1] != self.encoder.dimension):
+                vectors = None
+            segments.append(vectors)
+        rows = {key: location for key, location in rows.items()
+                if segments[location[0]] is not None and location[1] < len(segments[location[0]])}
+        return names, segments, rows
+    
+    def _load(self):
+        """
+        Memory-map the stored segments and read the manifest, if present.
+        """
+        self._segment_names, self._segments, self._rows = self._read_manifest()
+        self._pending_rows = {}
+        self._pending_vectors = []
+    
+    def key(self, text):
+        """
+        Cache key of a text for this cache's encoder.
+        
+        Args:
+            text (str): Preprocessed text
+            
+        Returns:
+            str: Hex digest of the encoder id and the text
+        """
+        return hashlib.sha1(f"{self.encoder.encoder_id}\0{text}".encode("utf-8")).hexdigest()
+    
+    @property
+    def pending(self):
+        """
+        int: Number of encoded vectors not written to disk yet.
+        """
+        return len(self._pending_vectors)
+    
+    def _lookup(self, key):
+        """
+        Return the cached vector for a key, or None.
+        """
+        location = self._rows.get(key)
+        if location is not None:
+            return self._segments[location[0]][location[1]]
+        row = self._pending_rows.get(key)
+        if row is not None:
+            return self._pending_vectors[row]
+        return None
+    
+    def encode(self, texts):
+        """
+        Return embeddings for the texts, encoding only those not cached yet.
+        
+        Args:
+            texts (list): Preprocessed texts
+            
+        Returns:
+            numpy.ndarray: float32 array of shape (len(texts), dimension)
+        """
+        keys = [self.key(text) for text in texts]
+        missing = {}
+        for key, text in zip(keys, texts):
+            if self._lookup(key) is None:
+                missing.setdefault(key, text)
+        
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            # Encode all cache misses in one batch
+            for key, vector in zip(missing, self.encoder.encode(list(missing.values()))):
+                self._pending_rows[key] = len(self._pending_vectors)
+                self._pending_vectors.append(vector)
+        
+        vectors = np.zeros((len(texts), self.encoder.dimension), dtype=np.float32)
+        for row, key in enumerate(keys):
+            vectors[row] = self._lookup(key)
+        return vectors
+    
+    def _write_segment(self, vectors):
+        """
+        Save vectors as a new segment under a unique name.
+        
+        Returns:
+            str: File name of the segment, relative to the cache directory
+        """
+        descriptor, path = tempfile.mkstemp(suffix=".npy", prefix=self._prefix + "-", dir=self.directory)
+        with os.fdopen(descriptor, 'wb') as file:
+            np.save(file, np.asarray(vectors, dtype=np.float32))
+        return os.path.basename(path)
+    
+    @contextlib.contextmanager
+    def _lock(self):
+        """
+        Hold an exclusive lock file while a writer merges and replaces the manifest.
+        """
+        path = self._manifest_path + ".lock"
+        deadline = time.monotonic() + self.LOCK_TIMEOUT
+        while True:
+            try:
+                descriptor = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                break
+            except FileExistsError:
+                try:
+                    stale = time.time() - os.path.getmtime(path) > self.LOCK_TIMEOUT
+                except OSError:
+                    stale = False  # released in the meantime
+                if stale:
+                    with contextlib.suppress(OSError):
+                        os.remove(path)
+                elif time.monotonic() > deadline:
+                    raise OSError(f"timed out waiting for {path}")
+                else:
+                    time.sleep(0.01)
+        try:
+            yield
+        finally:
+            os.close(descriptor)
+            with contextlib.suppress(OSError):
+                os.remove(path)
+    
+    def flush(self):
+        """
+        Write pending embeddings to disk and memory-map the updated cache.
+        """
+        if not self._pending_vectors:
+            return
+        
+        merged = []
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with self._lock():
+                # Another process may have flushed since we loaded; build on its manifest
+                names, segments, rows = self._read_manifest()
+                pending = [key for key in self._pending_rows if key not in rows]
+                if not pending:
+                    self._load()
+                    return
+                vectors = np.stack([self._pending_vectors[self._pending_rows[key]] for key in pending])
+                names.append(self._write_segment(vectors))
+                segments.append(vectors)
+                for row, key in enumerate(pending):
+                    rows[key] = [len(names) - 1, row]
+                
+                counts = [0] * len(names)
+                for segment, _ in rows.values():
+                    counts[segment] += 1
+                first = len(names) - 1
+                while first > 0 and counts[first - 1] <= self.MERGE_RATIO * sum(counts[first:]):
+                    first -= 1
+                if first < len(names) - 1:
+                    keys = [key for key, location in rows.items() if location[0] >= first]
+                    compacted = self._write_segment([segments[rows[key][0]][rows[key][1]] for key in keys])
+                    merged = names[first:]
+                    names = names[:first] + [compacted]
+                    for row, key in enumerate(keys):
+                        rows[key] = [first, row]
+                
+                descriptor, manifest_path = tempfile.mkstemp(suffix=".tmp", prefix=self._prefix + "-",
+                                                             dir=self.directory)
+                with os.fdopen(descriptor, 'w', encoding='utf-8') as file:
+                    json.dump({"segments": names, "rows": rows}, file)
+                os.replace(manifest_path, self._manifest_path)
+        except OSError as e:
+            print(f"Error saving embedding cache: {e}")
+            return
+        
+        # Unmap the merged segments before deleting them, which Windows requires
+        segments = None
+        self._segments = []
+        self._load()
+        for name in merged:
+            # Fails while another process still maps the segment; a harmless leftover
+            with contextlib.suppress(OSError):
+                os.remove(os.path.join(self.directory, name))
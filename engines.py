@@ -0,0 +1,895 @@
+"""
+Alternative retrieval engines for KomodoTourChatbot.
+
+Every engine indexes the preprocessed KB questions and implements the same small
+interface: build(texts), add(text) and search(text, k), where search returns a list
+of (index, score) tuples sorted by descending score, with scores between 0 and 1 so
+the chatbot's similarity_threshold keeps its meaning. Engines whose scores only
+order the results, like HybridEngine, are in SUGGESTION_ENGINES instead of ENGINES.
+"""
+
+import heapq
+import json
+import math
+from bisect import bisect_left
+
+try:
+    import numpy as np
+except ImportError:  # only the vectorized engines need numpy
+    np = None
+
+from embeddings import EmbeddingCache, HashingEncoder
+from text_processing import normalize_text
+from vector_index import FlatIndex, top_k_scores
+
+
+# Slack for comparing score bounds against exact scores summed in a different order
+BOUND_EPSILON = 1e-9
+
+
+class TopKSelector:
+    """
+    Keep the k highest-scoring entries seen so far in a bounded min-heap.
+    
+    Ties are broken in favour of the lower entry index, matching a stable sort
+    of the whole dataset by descending score. With groups, at most one entry (the
+    best) is kept per group, e.g. per answer when a question has several entries.
+    """
+    
+    def __init__(self, k, groups=None):
+        """
+        Create an empty selection.
+        
+        Args:
+            k (int): Number of entries to keep
+            groups (list): Optional group id per entry index
+        """
+        self.k = k
+        self.groups = groups
+        self._heap = []
+        # group -> heap item of the entry currently kept for it
+        self._held = {}
+    
+    @property
+    def cutoff(self):
+        """
+        float: Score an entry has to reach to enter the selection, -inf while it is not
+               full, or inf if it keeps no entries at all.
+        """
+        if self.k <= 0:
+            return float('inf')
+        if len(self._heap) < self.k:
+            return float('-inf')
+        return self._heap[0][0]
+    
+    def admits(self, score, index):
+        """
+        Check whether an entry with the given score (or score upper bound) can enter the selection.
+        
+        Args:
+            score (float): Score or upper bound of the entry
+            index (int): Position of the entry in the dataset
+            
+        Returns:
+            bool: True if the entry would be kept
+        """
+        if self.k <= 0:
+            return False
+        if len(self._heap) < self.k:
+            return True
+        low_score, low_neg_index = self._heap[0]
+        return score > low_score or (score == low_score and -index > low_neg_index)
+    
+    def push(self, score, index):
+        """
+        Offer an entry to the selection, evicting the current lowest entry if needed.
+        
+        Args:
+            score (float): Score of the entry
+            index (int): Position of the entry in the dataset
+        """
+        if self.groups is not None:
+            self._push_grouped(score, index)
+        elif len(self._heap) < self.k:
+            heapq.heappush(self._heap, (score, -index))
+        elif self.admits(score, index):
+            heapq.heapreplace(self._heap, (score, -index))
+    
+    def _push_grouped(self, score, index):
+        """
+        Offer an entry, keeping only the best entry of its group.
+        """
+        item = (score, -index)
+        group = self.groups[index]
+        held = self._held.get(group)
+        if held is not None:
+            if item > held:
+                self._heap.remove(held)
+                self._heap.append(item)
+                heapq.heapify(self._heap)
+                self._held[group] = item
+            return
+        
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, item)
+        elif self.admits(score, index):
+            evicted = heapq.heapreplace(self._heap, item)
+            del self._held[self.groups[-evicted[1]]]
+        else:
+            return
+        self._held[group] = item
+    
+    def items(self):
+        """
+        Return the selected entries, best first.
+        
+        Returns:
+            list: List of tuples (index, score) sorted by descending score
+        """
+        return [(-neg_index, score) for score, neg_index in sorted(self._heap, reverse=True)]
+
+
+def require_numpy(feature):
+    """
+    Raise a helpful error when an engine that needs NumPy is used without it.
+    
+    Args:
+        feature (str): Name of the class or function needing NumPy
+    """
+    if np is None:
+        raise ImportError(f"{feature} requires numpy (pip install numpy)")
+
+
+class BM25Engine:
+    """
+    Okapi BM25 ranking over the words of the stored questions.
+    
+    Scores are divided by the geometric mean of the self-scores of the query and
+    the stored question, i.e. what each scores against an identical document, and
+    capped at 1.0. Only a stored question identical to the query scores 1.0; words
+    missing on either side lower the score, so a query made of one common word does
+    not match every question containing it.
+    
+    Top-k retrieval uses MaxScore dynamic pruning: every term carries an upper bound
+    on its contribution and terms are processed strongest first. Once the k-th best
+    accumulated score exceeds what the unprocessed terms can add together, no new
+    candidates are opened, and candidates that cannot catch up any more are dropped
+    before the remaining posting lists are probed for the survivors.
+    """
+    
+    name = "bm25"
+    
+    def __init__(self, k1=1.2, b=0.75):
+        """
+        Create an empty engine.
+        
+        Args:
+            k1 (float): Term-frequency saturation
+            b (float): Strength of the document-length normalization
+        """
+        self.k1 = k1
+        self.b = b
+        self.build([])
+    
+    def build(self, texts):
+        """
+        Index a list of preprocessed questions, replacing the current index.
+        
+        Args:
+            texts (list): Preprocessed questions, in dataset order
+        """
+        # term -> ([document indices], [term frequencies]), both in index order
+        self._postings = {}
+        # term -> [highest term frequency, shortest document length] for MaxScore bounds
+        self._term_bounds = {}
+        self._doc_lengths = []
+        self._total_length = 0
+        # Square roots of the self-scores, recomputed lazily since adding changes every IDF
+        self._doc_norms = None
+        for text in texts:
+            self.add(text)
+    
+    def add(self, text):
+        """
+        Index one more preprocessed question.
+        
+        Args:
+            text (str): Preprocessed question
+            
+        Returns:
+            int: Index of the new document
+        """
+        index = len(self._doc_lengths)
+        tokens = text.split()
+        frequencies = {}
+        for token in tokens:
+            frequencies[token] = frequencies.get(token, 0) + 1
+        for token, frequency in frequencies.items():
+            documents, counts = self._postings.setdefault(token, ([], []))
+            documents.append(index)
+            counts.append(frequency)
+            bounds = self._term_bounds.setdefault(token, [frequency, len(tokens)])
+            bounds[0] = max(bounds[0], frequency)
+            bounds[1] = min(bounds[1], len(tokens))
+        
+        self._doc_lengths.append(len(tokens))
+        self._total_length += len(tokens)
+        self._doc_norms = None
+        return index
+    
+    def idf(self, term):
+        """
+        Inverse document frequency of a term (Lucene's always-positive variant).
+        
+        Args:
+            term (str): Query term
+            
+        Returns:
+            float: IDF weight
+        """
+        document_count = len(self._doc_lengths)
+        frequency = len(self._postings.get(term, ((), ()))[0])
+        return math.log(1.0 + (document_count - frequency + 0.5) / (frequency + 0.5))
+    
+    def _term_weight(self, frequency, length, average_length):
+        """
+        BM25 term-frequency component for one posting.
+        """
+        norm = self.k1 * (1.0 - self.b + self.b * length / average_length)
+        return frequency * (self.k1 + 1.0) / (frequency + norm)
+    
+    def _build_doc_norms(self, average_length):
+        """
+        Score every stored question against itself and keep the square roots.
+        """
+        self_scores = [0.0] * len(self._doc_lengths)
+        for term, (documents, counts) in self._postings.items():
+            idf = self.idf(term)
+            for index, frequency in zip(documents, counts):
+                self_scores[index] += idf * self._term_weight(frequency, self._doc_lengths[index], average_length)
+        self._doc_norms = [math.sqrt(score) for score in self_scores]
+    
+    def search(self, text, k):
+        """
+        Find the k best-scoring questions for a preprocessed query.
+        
+        Args:
+            text (str): Preprocessed query
+            k (int): Number of results
+            
+        Returns:
+            list: List of tuples (index, score) sorted by descending score
+        """
+        tokens = text.split()
+        if k <= 0 or not tokens or not self._doc_lengths:
+            return []
+        
+        average_length = max(self._total_length / len(self._doc_lengths), 1e-9)
+        if self._doc_norms is None:
+            self._build_doc_norms(average_length)
+        doc_norms = self._doc_norms
+        frequencies = {}
+        for token in tokens:
+            frequencies[token] = frequencies.get(token, 0) + 1
+        # The query scored against itself, unknown terms included
+        query_self_score = 0.0
+        # (upper bound, idf, document indices, term frequencies) per known query term
+        lists = []
+        for term, query_frequency in frequencies.items():
+            idf = self.idf(term)
+            query_self_score += idf * self._term_weight(query_frequency, len(tokens), average_length)
+            if term in self._postings:
+                max_frequency, min_length = self._term_bounds[term]
+                upper = idf * self._term_weight(max_frequency, min_length, average_length)
+                documents, counts = self._postings[term]
+                lists.append((upper, idf, documents, counts))
+        
+        # Contributions are divided by the document norm as they are accumulated, and by
+        # query_norm at the end. A document's self-score covers every term it shares with
+        # the query, so raw contributions x of some terms give x / norm <= sqrt(x).
+        query_norm = math.sqrt(query_self_score)
+        # Strongest terms first; remaining[i] bounds what terms i.. can still add together
+        lists.sort(key=lambda entry: entry[0], reverse=True)
+        remaining = [0.0] * (len(lists) + 1)
+        for position in range(len(lists) - 1, -1, -1):
+            remaining[position] = remaining[position + 1] + lists[position][0]
+        remaining = [math.sqrt(bound) for bound in remaining]
+        
+        def kth_best(scores):
+            if len(scores) < k:
+                return float('-inf')
+            # Scores are capped at the query norm, so ties at the cap must not be pruned
+            return min(heapq.nlargest(k, scores.values())[-1], query_norm)
+        
+        scores = {}
+        position = 0
+        # Open new accumulators until the unseen terms together cannot reach the k-th score
+        while position < len(lists) and remaining[position] + BOUND_EPSILON >= kth_best(scores):
+            _, idf, documents, counts = lists[position]
+            for index, frequency in zip(documents, counts):
+                weight = idf * self._term_weight(frequency, self._doc_lengths[index], average_length)
+                scores[index] = scores.get(index, 0.0) + weight / doc_norms[index]
+            position += 1
+        
+        # Only complete the remaining candidates, dropping those that can no longer make it
+        while position < len(lists) and scores:
+            threshold = kth_best(scores)
+            for index in [index for index, score in scores.items()
+                          if score + remaining[position] + BOUND_EPSILON < threshold]:
+                del scores[index]
+            
+            _, idf, documents, counts = lists[position]
+            if len(documents) <= len(scores):
+                matches = ((index, frequency) for index, frequency in zip(documents, counts) if index in scores)
+            else:
+                matches = []
+                for index in scores:
+                    pointer = bisect_left(documents, index)
+                    if pointer < len(documents) and documents[pointer] == index:
+                        matches.append((index, counts[pointer]))
+            for index, frequency in matches:
+                weight = idf * self._term_weight(frequency, self._doc_lengths[index], average_length)
+                scores[index] += weight / doc_norms[index]
+            position += 1
+        
+        top = TopKSelector(k)
+        for index, score in scores.items():
+            top.push(min(score / query_norm, 1.0), index)
+        return top.items()
+
+
+class NGramEngine:
+    """
+    Cosine similarity between character n-gram (by default trigram) count vectors.
+    
+    Questions are padded with a space on both sides, so a typo such as "komodo dragn"
+    still shares most of its trigrams with "komodo dragons". The stored vectors are
+    L2-normalized rows of a CSR-style sparse matrix, and a query is scored against
+    every row with a single sparse-dense product.
+    """
+    
+    name = "ngram"
+    
+    def __init__(self, n=3):
+        """
+        Create an empty engine.
+        
+        Args:
+            n (int): Length of the character n-grams
+        """
+        require_numpy("NGramEngine")
+        self.n = n
+        self.build([])
+    
+    def build(self, texts):
+        """
+        Index a list of preprocessed questions, replacing the current index.
+        
+        Args:
+            texts (list): Preprocessed questions, in dataset order
+        """
+        self._vocabulary = {}
+        self._indptr = np.zeros(1, dtype=np.int64)
+        self._indices = np.zeros(0, dtype=np.int32)
+        self._data = np.zeros(0, dtype=np.float32)
+        self._rows = np.zeros(0, dtype=np.int64)
+        # Rows added since the arrays were last compacted
+        self._pending = []
+        for text in texts:
+            self.add(text)
+    
+    def ngram_counts(self, text):
+        """
+        Count the character n-grams of a text.
+        
+        Args:
+            text (str): Preprocessed text
+            
+        Returns:
+            dict: n-gram -> count
+        """
+        padded = f" {text} "
+        counts = {}
+        for start in range(max(len(padded) - self.n + 1, 1)):
+            gram = padded[start:start + self.n]
+            counts[gram] = counts.get(gram, 0) + 1
+        return counts
+    
+    def _vector(self, text, grow):
+        """
+        Turn a text into sorted column indices and L2-normalized weights.
+        
+        Unknown n-grams get new columns when grow is set; otherwise they are dropped
+        after contributing to the norm, so they still lower the cosine.
+        """
+        counts = self.ngram_counts(text)
+        norm = math.sqrt(sum(count * count for count in counts.values()))
+        columns = []
+        weights = []
+        for gram, count in counts.items():
+            column = self._vocabulary.get(gram)
+            if column is None and grow:
+                column = self._vocabulary[gram] = len(self._vocabulary)
+            if column is not None:
+                columns.append(column)
+                weights.append(count / norm)
+        return columns, weights
+    
+    def add(self, text):
+        """
+        Index one more preprocessed question.
+        
+        Args:
+            text (str): Preprocessed question
+            
+        Returns:
+            int: Index of the new document
+        """
+        self._pending.append(self._vector(text, grow=True))
+        return len(self._indptr) - 1 + len(self._pending) - 1
+    
+    def _compact(self):
+        """
+        Move pending rows into the CSR arrays.
+        """
+        if not self._pending:
+            return
+        lengths = [len(columns) for columns, _ in self._pending]
+        first_row = len(self._indptr) - 1
+        self._indptr = np.concatenate([self._indptr, self._indptr[-1] + np.cumsum(lengths)])
+        self._indices = np.concatenate([self._indices] + [np.asarray(columns, dtype=np.int32) for columns, _ in self._pending])
+        self._data = np.concatenate([self._data] + [np.asarray(weights, dtype=np.float32) for _, weights in self._pending])
+        # Row of every stored value, for scattering products back with np.bincount
+        new_rows = np.repeat(np.arange(first_row, first_row + len(lengths)), lengths)
+        self._rows = np.concatenate([self._rows, new_rows])
+        self._pending = []
+    
+    def scores(self, text):
+        """
+        Cosine similarity between a preprocessed query and every stored question.
+        
+        Args:
+            text (str): Preprocessed query
+            
+        Returns:
+            numpy.ndarray: One score per stored question
+        """
+        self._compact()
+        query = np.zeros(len(self._vocabulary), dtype=np.float32)
+        columns, weights = self._vector(text, grow=False)
+        query[columns] = weights
+        return np.bincount(self._rows, weights=self._data * query[self._indices],
+                           minlength=len(self._indptr) - 1)
+    
+    def search(self, text, k):
+        """
+        Find the k most similar questions for a preprocessed query.
+        
+        Args:
+            text (str): Preprocessed query
+            k (int): Number of results
+            
+        Returns:
+            list: List of tuples (index, score) sorted by descending score
+        """
+        return top_k_scores(self.scores(text), k)
+    
+    def similarity(self, text1, text2):
+        """
+        n-gram cosine similarity of two strings, usable in place of calculate_similarity.
+        
+        Args:
+            text1 (str): First string
+            text2 (str): Second string
+            
+        Returns:
+            float: Similarity score between 0 and 1
+        """
+        counts1 = self.ngram_counts(text1)
+        counts2 = self.ngram_counts(text2)
+        dot = sum(count * counts2.get(gram, 0) for gram, count in counts1.items())
+        norm1 = math.sqrt(sum(count * count for count in counts1.values()))
+        norm2 = math.sqrt(sum(count * count for count in counts2.values()))
+        return dot / (norm1 * norm2)
+
+
+class TfidfEngine:
+    """
+    Cosine similarity between TF-IDF vectors of word (and optionally character) n-grams.
+    
+    The stored questions form a dense, C-contiguous float32 matrix with L2-normalized
+    rows, so scoring a query is a single matrix-vector product. Adding a question
+    changes the IDF weights, so the matrix is rebuilt lazily on the next search.
+    """
+    
+    name = "tfidf"
+    
+    def __init__(self, word_ngrams=(1, 2), char_ngrams=None):
+        """
+        Create an empty engine.
+        
+        Args:
+            word_ngrams (tuple): Smallest and largest word n-gram length
+            char_ngrams (tuple): Smallest and largest character n-gram length, or None
+                                 to use words only
+        """
+        require_numpy("TfidfEngine")
+        self.word_ngrams = word_ngrams
+        self.char_ngrams = char_ngrams
+        self.build([])
+    
+    def build(self, texts):
+        """
+        Index a list of preprocessed questions, replacing the current index.
+        
+        Args:
+            texts (list): Preprocessed questions, in dataset order
+        """
+        self._documents = []
+        self._document_frequencies = {}
+        self._vocabulary = {}
+        self._matrix = None
+        for text in texts:
+            self.add(text)
+    
+    def features(self, text):
+        """
+        Count the n-gram features of a text.
+        
+        Args:
+            text (str): Preprocessed text
+            
+        Returns:
+            dict: feature -> count, word and character features kept apart by prefix
+        """
+        counts = {}
+        words = text.split()
+        low, high = self.word_ngrams
+        for size in range(low, high + 1):
+            for start in range(len(words) - size + 1):
+                feature = "w:" + " ".join(words[start:start + size])
+                counts[feature] = counts.get(feature, 0) + 1
+        if self.char_ngrams:
+            padded = f" {text} "
+            low, high = self.char_ngrams
+            for size in range(low, high + 1):
+                for start in range(len(padded) - size + 1):
+                    feature = "c:" + padded[start:start + size]
+                    counts[feature] = counts.get(feature, 0) + 1
+        return counts
+    
+    def add(self, text):
+        """
+        Index one more preprocessed question.
+        
+        Args:
+            text (str): Preprocessed question
+            
+        Returns:
+            int: Index of the new document
+        """
+        counts = self.features(text)
+        self._documents.append(counts)
+        for feature in counts:
+            self._document_frequencies[feature] = self._document_frequencies.get(feature, 0) + 1
+        self._matrix = None
+        return len(self._documents) - 1
+    
+    def idf(self, feature):
+        """
+        Smoothed inverse document frequency of a feature.
+        
+        Args:
+            feature (str): Feature as returned by features()
+            
+        Returns:
+            float: IDF weight, also defined for unseen features
+        """
+        frequency = self._document_frequencies.get(feature, 0)
+        return math.log((1 + len(self._documents)) / (1 + frequency)) + 1.0
+    
+    def _build_matrix(self):
+        """
+        Lay out the L2-normalized TF-IDF rows as one contiguous float32 matrix.
+        """
+        self._vocabulary = {feature: column for column, feature in enumerate(self._document_frequencies)}
+        idf = np.ones(len(self._vocabulary), dtype=np.float32)
+        for feature, column in self._vocabulary.items():
+            idf[column] = self.idf(feature)
+        
+        matrix = np.zeros((len(self._documents), len(self._vocabulary)), dtype=np.float32)
+        for row, counts in enumerate(self._documents):
+            columns = [self._vocabulary[feature] for feature in counts]
+            matrix[row, columns] = list(counts.values())
+        matrix *= idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        self._idf = idf
+        self._matrix = np.ascontiguousarray(matrix / np.maximum(norms, 1e-12))
+    
+    def vector(self, text):
+        """
+        L2-normalized TF-IDF vector of a preprocessed query in the current vocabulary.
+        
+        Unseen features are left out of the vector but still count towards its norm,
+        so unknown words lower the cosine instead of being ignored.
+        
+        Args:
+            text (str): Preprocessed query
+            
+        Returns:
+            numpy.ndarray: float32 vector, all zeros if the query has no features
+        """
+        if self._matrix is None:
+            self._build_matrix()
+        query = np.zeros(len(self._vocabulary), dtype=np.float32)
+        norm = 0.0
+        for feature, count in self.features(text).items():
+            weight = count * self.idf(feature)
+            norm += weight * weight
+            column = self._vocabulary.get(feature)
+            if column is not None:
+                query[column] = weight
+        if norm > 0:
+            query /= math.sqrt(norm)
+        return query
+    
+    def search(self, text, k):
+        """
+        Find the k most similar questions for a preprocessed query.
+        
+        Args:
+            text (str): Preprocessed query
+            k (int): Number of results
+            
+        Returns:
+            list: List of tuples (index, score) sorted by descending score
+        """
+        query = self.vector(text)
+        return top_k_scores(self._matrix @ query, k)
+
+
+class EmbeddingEngine:
+    """
+    Dense sentence-embedding similarity with a precomputed KB embedding matrix.
+    
+    All stored questions are encoded once into L2-normalized float32 vectors, so a
+    query only encodes the short user input and takes one dot product with the
+    stored matrix (or, with an approximate index such as HNSWIndex, with the few
+    vectors the index visits). Any encoder from the embeddings module can be
+    plugged in; the default HashingEncoder needs no model download. With an
+    EmbeddingCache, stored questions are only encoded if the cache has not seen
+    them before.
+    """
+    
+    name = "embedding"
+    # Questions added one at a time are written to the cache in batches of this many
+    FLUSH_BATCH = 32
+    
+    def __init__(self, encoder=None, cache_dir=None, index=None):
+        """
+        Create an empty engine.
+        
+        Args:
+            encoder (object): Sentence encoder, HashingEncoder() if None
+            cache_dir (str): Directory for an EmbeddingCache of the stored questions,
+                             or None to encode them on every start
+            index (object): Vector index from the vector_index module, FlatIndex() if
+                            None; an index loaded from disk is kept by build() if it
+                            already holds exactly the questions' vectors
+        """
+        require_numpy("EmbeddingEngine")
+        self.encoder = encoder if encoder is not None else HashingEncoder()
+        self.cache = EmbeddingCache(cache_dir, self.encoder) if cache_dir else None
+        self.index = index if index is not None else FlatIndex()
+        self._texts = []
+        if getattr(self.index, "vector_source", False) is None:
+            # Quantized indexes re-rank their best candidates with exact vectors
+            self.index.vector_source = self.exact_vectors
+    
+    def _encode_questions(self, texts, batch=1):
+        """
+        Encode stored questions, going through the cache if there is one.
+        
+        The cache is flushed once at least batch vectors are pending.
+        """
+        if self.cache is None:
+            return self.encoder.encode(texts)
+        vectors = self.cache.encode(texts)
+        if self.cache.pending >= batch:
+            self.cache.flush()
+        return vectors
+    
+    def build(self, texts):
+        """
+        Encode a list of preprocessed questions, replacing the indexed vectors.
+        
+        Args:
+            texts (list): Preprocessed questions, in dataset order
+        """
+        self._texts = list(texts)
+        vectors = self._encode_questions(self._texts) if texts else None
+        if vectors is not None and self.index.size == len(vectors) and np.array_equal(self.index.vectors, vectors):
+            return
+        self.index.clear()
+        if vectors is not None:
+            self.index.add(vectors)
+    
+    def add(self, text):
+        """
+        Encode and index one more preprocessed question.
+        
+        Embeddings of added questions are written to the cache FLUSH_BATCH at a
+        time, or by flush(); until then a restart simply encodes them again.
+        
+        Args:
+            text (str): Preprocessed question
+            
+        Returns:
+            int: Index of the new document
+        """
+        self._texts.append(text)
+        self.index.add(self._encode_questions([text], self.FLUSH_BATCH))
+        return self.index.size - 1
+    
+    def flush(self):
+        """
+        Write the embeddings of questions added since the last write to the cache.
+        """
+        if self.cache is not None:
+            self.cache.flush()
+    
+    def exact_vectors(self, ids):
+        """
+        Full-precision vectors of stored questions, from the cache or re-encoded.
+        
+        Args:
+            ids (list): Question indices
+            
+        Returns:
+            numpy.ndarray: float32 array with one row per id
+        """
+        texts = [self._texts[index] for index in ids]
+        if self.cache is not None:
+            return self.cache.encode(texts)
+        return self.encoder.encode(texts)
+    
+    def search(self, text, k):
+        """
+        Find the k most similar questions for a preprocessed query.
+        
+        Args:
+            text (str): Preprocessed query
+            k (int): Number of results
+            
+        Returns:
+            list: List of tuples (index, score) sorted by descending score
+        """
+        return self.index.search(self.encoder.encode([text])[0], k)
+    
+    def train_index_from_file(self, file_path, preprocess=normalize_text):
+        """
+        Train the vector index (e.g. IVFIndex centroids) on the questions of a QA file.
+        
+        Args:
+            file_path (str): JSON file in the komodo_qa_data.json format
+            preprocess (callable): Preprocessing the indexed questions went through,
+                                   e.g. the chatbot's preprocess_text when synonyms
+                                   are configured
+        """
+        with open(file_path, 'r', encoding='utf-8') as file:
+            qa_data = json.load(file)
+        questions = [preprocess(qa_pair["question"]) for qa_pair in qa_data]
+        self.index.train(self._encode_questions(questions))
+
+
+class HybridEngine:
+    """
+    Reciprocal rank fusion of several engines.
+    
+    Every engine only retrieves its own top `depth` questions; a question scores
+    1 / (k_rrf + rank) for each list it appears in. The fused score is divided by
+    its maximum, so 1.0 means every engine ranked the question first. The scores
+    express agreement between the engines rather than textual similarity, so the
+    engine is meant for KomodoTourChatbot(suggestion_engine="hybrid"), which keeps
+    the similarity_threshold verdict with the main engine.
+    """
+    
+    name = "hybrid"
+    # Scores rank suggestions but cannot be compared with similarity_threshold
+    ranking_only = True
+    
+    def __init__(self, engines=None, depth=20, k_rrf=60):
+        """
+        Create an empty engine.
+        
+        Args:
+            engines (list): Engines to fuse, BM25, character n-grams and embeddings
+                            if None
+            depth (int): Number of results taken from every engine (at least k)
+            k_rrf (int): Rank offset damping the influence of the top ranks
+        """
+        if engines is None:
+            engines = [BM25Engine(), NGramEngine(), EmbeddingEngine()]
+        self.engines = engines
+        self.depth = depth
+        self.k_rrf = k_rrf
+    
+    def build(self, texts):
+        """
+        Index a list of preprocessed questions in every engine.
+        
+        Args:
+            texts (list): Preprocessed questions, in dataset order
+        """
+        for engine in self.engines:
+            engine.build(texts)
+    
+    def add(self, text):
+        """
+        Index one more preprocessed question in every engine.
+        
+        Args:
+            text (str): Preprocessed question
+            
+        Returns:
+            int: Index of the new document
+        """
+        for engine in self.engines:
+            index = engine.add(text)
+        return index
+    
+    def search(self, text, k):
+        """
+        Find the k questions with the best fused rank for a preprocessed query.
+        
+        Args:
+            text (str): Preprocessed query
+            k (int): Number of results
+            
+        Returns:
+            list: List of tuples (index, score) sorted by descending score
+        """
+        fused = {}
+        for engine in self.engines:
+            for rank, (index, _) in enumerate(engine.search(text, max(self.depth, k)), 1):
+                fused[index] = fused.get(index, 0.0) + 1.0 / (self.k_rrf + rank)
+        
+        best_possible = len(self.engines) / (self.k_rrf + 1.0)
+        top = TopKSelector(k)
+        for index, score in fused.items():
+            top.push(min(score / best_possible, 1.0), index)
+        return top.items()
+
+
+# Engines selectable by name through KomodoTourChatbot(engine=...)
+ENGINES = {
+    BM25Engine.name: BM25Engine,
+    NGramEngine.name: NGramEngine,
+    TfidfEngine.name: TfidfEngine,
+    EmbeddingEngine.name: EmbeddingEngine,
+}
+
+# Engines usable for "Did you mean" suggestions, which only need a ranking
+SUGGESTION_ENGINES = dict(ENGINES, **{HybridEngine.name: HybridEngine})
+
+
+def create_engine(name, suggestions=False, **options):
+    """
+    Create a retrieval engine by name.
+    
+    Args:
+        name (str): One of the ENGINES keys, or of SUGGESTION_ENGINES if suggestions
+        suggestions (bool): Whether the engine only ranks suggestions
+        **options: Keyword arguments for the engine's constructor
+        
+    Returns:
+        object: The new, empty engine
+    """
+    engines = SUGGESTION_ENGINES if suggestions else ENGINES
+    try:
+        engine_class = engines[name]
+    except KeyError:
+        if name in SUGGESTION_ENGINES:
+            raise ValueError(f"Engine '{name}' can only be used as a suggestion engine") from None
+        raise ValueError(f"Unknown engine '{name}', expected one of: {', '.join(sorted(engines))}") from None
+    return engine_class(**options)
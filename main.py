@@ -1,93 +1,555 @@
 import json
-import re
+import os
 from difflib import SequenceMatcher
 
+from engines import TopKSelector, create_engine
+from paraphrases import ParaphraseTable
+from query_cache import QueryCache
+from synonyms import SynonymCanonicalizer
+from text_processing import STOPWORDS, normalize_text
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, the length buckets are used without it
+    np = None
+
+
+def cascaded_ratio(matcher, min_score=None):
+    """
+    Compute matcher.ratio(), trying difflib's cheaper upper bounds first.
+    
+    real_quick_ratio() and quick_ratio() never underestimate ratio(), so when either
+    of them is already below min_score the full ratio cannot reach it and is skipped.
+    
+    Args:
+        matcher (SequenceMatcher): Matcher with both sequences set
+        min_score (float): Score the result has to reach to be of interest, or None
+        
+    Returns:
+        float: Similarity score between 0 and 1, or 0.0 if it cannot reach min_score
+    """
+    if min_score is not None and min_score > 0:
+        if matcher.real_quick_ratio() < min_score or matcher.quick_ratio() < min_score:
+            return 0.0
+    return matcher.ratio()
+
+
+class CharHistogramIndex:
+    """
+    Character-count matrix of the stored questions for vectorized similarity bounds.
+    
+    Each row counts a-z, 0-9, space and every other character in one shared column.
+    The multiset intersection of two rows bounds SequenceMatcher.quick_ratio(), and
+    therefore ratio(), from above, so one vectorized minimum-and-sum yields a bound
+    for every stored question at once.
+    """
+    
+    ALPHABET = "abcdefghijklmnopqrstuvwxyz0123456789 "
+    
+    def __init__(self, capacity=1024):
+        """
+        Create an empty index.
+        
+        Args:
+            capacity (int): Number of rows to allocate up front; the matrix grows as needed
+        """
+        self._columns = {char: column for column, char in enumerate(self.ALPHABET)}
+        self._counts = np.zeros((capacity, len(self.ALPHABET) + 1), dtype=np.int32)
+        self._lengths = np.zeros(capacity, dtype=np.int64)
+        self.size = 0
+    
+    def histogram(self, text):
+        """
+        Count the characters of a text per column.
+        
+        Args:
+            text (str): Preprocessed text
+            
+        Returns:
+            numpy.ndarray: Character counts
+        """
+        row = np.zeros(len(self.ALPHABET) + 1, dtype=np.int32)
+        other = len(self.ALPHABET)
+        for char in text:
+            row[self._columns.get(char, other)] += 1
+        return row
+    
+    def add(self, text):
+        """
+        Append the histogram of a stored question.
+        
+        Args:
+            text (str): Preprocessed question
+        """
+        if self.size == len(self._counts):
+            # Double the buffers so repeated add_qa_pair calls stay amortized O(1)
+            self._counts = np.concatenate([self._counts, np.zeros_like(self._counts)])
+            self._lengths = np.concatenate([self._lengths, np.zeros_like(self._lengths)])
+        self._counts[self.size] = self.histogram(text)
+        self._lengths[self.size] = len(text)
+        self.size += 1
+    
+    def upper_bounds(self, text, rows=None):
+        """
+        Bound the SequenceMatcher ratio between a query and the stored questions.
+        
+        Args:
+            text (str): Preprocessed query
+            rows (numpy.ndarray): Optional indices of the stored questions to bound
+            
+        Returns:
+            numpy.ndarray: One upper bound per stored question (or per requested row)
+        """
+        counts = self._counts[:self.size] if rows is None else self._counts[rows]
+        lengths = self._lengths[:self.size] if rows is None else self._lengths[rows]
+        common = np.minimum(counts, self.histogram(text)).sum(axis=1)
+        totals = lengths + len(text)
+        # Two empty strings are a perfect match for SequenceMatcher
+        return np.where(totals > 0, 2.0 * common / np.maximum(totals, 1), 1.0)
+
+
 class KomodoTourChatbot:
     """
     A terminal-based chatbot for answering questions about Komodo National Park tours.
     Uses string similarity matching to find the closest question in the dataset.
     """
     
-    def __init__(self, qa_data, similarity_threshold=0.75):
+    def __init__(self, qa_data, similarity_threshold=0.75, token_prefilter=False, engine=None,
+                 suggestion_engine=None, synonyms=None, synonym_variants=0,
+                 paraphrase_table=None, query_cache=None):
         """
         Initialize the chatbot with question-answer data.
         
         Args:
             qa_data (list): List of question-answer dictionaries
             similarity_threshold (float): Minimum similarity score to consider a match
+            token_prefilter (bool): Only score stored questions sharing a non-stopword
+                                    with the user question (falls back to all of them
+                                    when none do)
+            engine (str or object): Retrieval engine replacing SequenceMatcher scoring,
+                                    either a name from engines.ENGINES (e.g. "bm25")
+                                    or an engine instance; None keeps SequenceMatcher
+            suggestion_engine (str or object): Optional engine (e.g. "hybrid") producing
+                                               the "Did you mean" suggestions, while the
+                                               best match still comes from engine
+            synonyms (str or dict): Path to a synonyms.json-style file (or its parsed
+                                    content); stored and user questions are then
+                                    rewritten to the canonical synonym phrases
+            synonym_variants (int): If positive, synonyms are used at index time
+                                    instead: every stored question also gets up to
+                                    this many synonym-substituted variants pointing
+                                    to the same answer, and queries stay as typed
+            paraphrase_table (str, bool or ParaphraseTable): Path of a table built with
+                                    paraphrases.py, a table instance, or True to build
+                                    one in memory; queries whose canonical synonym form
+                                    equals a stored question's are answered from it
+                                    without any scoring
+            query_cache (bool or QueryCache): Cache of ranking results keyed by the
+                                    cache's key policy, or True for a QueryCache
+                                    with default bounds and exact keys; it is
+                                    invalidated whenever the knowledge base changes
         """
         self.qa_data = qa_data
         self.similarity_threshold = similarity_threshold
+        self.token_prefilter = token_prefilter
+        self.engine = create_engine(engine) if isinstance(engine, str) else engine
+        if getattr(self.engine, "ranking_only", False):
+            raise ValueError(f"{type(self.engine).__name__} can only be used as suggestion_engine")
+        if isinstance(suggestion_engine, str):
+            suggestion_engine = create_engine(suggestion_engine, suggestions=True)
+        self.suggestion_engine = suggestion_engine
+        if isinstance(synonyms, str):
+            self.canonicalizer = SynonymCanonicalizer.from_file(synonyms)
+        elif synonyms is not None:
+            self.canonicalizer = SynonymCanonicalizer(synonyms)
+        else:
+            self.canonicalizer = None
+        self.synonym_variants = synonym_variants if self.canonicalizer is not None else 0
+        if isinstance(paraphrase_table, str):
+            paraphrase_table = ParaphraseTable.load(paraphrase_table, self.canonicalizer)
+        elif paraphrase_table is True:
+            paraphrase_table = ParaphraseTable(self.canonicalizer)
+        self.paraphrase_table = paraphrase_table if paraphrase_table is not False else None
+        if query_cache is True:
+            query_cache = QueryCache()
+        self.query_cache = query_cache if query_cache is not False else None
+        # Bumped on every change to the indexed questions, invalidating cached results
+        self.kb_version = 0
+        # Search counters, e.g. how many stored questions the length bound let us skip
+        self.stats = {"queries": 0, "entries_visited": 0, "skipped_by_length": 0,
+                      "skipped_by_histogram": 0, "exact_hits": 0,
+                      "skipped_by_tokens": 0, "paraphrase_hits": 0}
+        self.build_index()
+    
+    def build_index(self):
+        """
+        Normalize every stored question once and prepare a SequenceMatcher for it,
+        so queries only preprocess the user input.
+        
+        Call this again if qa_data is modified without going through add_qa_pair.
+        A paraphrase table built from other questions is rebuilt as well.
+        """
+        self.kb_version += 1
+        # One index entry per stored question and per synonym variant of it
+        self._processed_questions = []
+        self._entry_qa_indices = []
+        self._matchers = []
+        self._exact_questions = {}
+        self._length_buckets = {}
+        self._token_postings = {}
+        self._histograms = CharHistogramIndex(max(len(self.qa_data), 1)) if np is not None else None
+        for qa_index, qa_pair in enumerate(self.qa_data):
+            self._index_question(qa_pair["question"], qa_index)
+        for engine in (self.engine, self.suggestion_engine):
+            if engine is not None:
+                engine.build(self._processed_questions)
+        self._sync_paraphrase_table()
+    
+    def _sync_paraphrase_table(self):
+        """
+        Bring the paraphrase table in line with qa_data.
+        
+        A table built from the same questions, in the same order, is only extended
+        with the questions added since; any other table is rebuilt.
+        """
+        table = self.paraphrase_table
+        if table is None:
+            return
+        questions = [qa_pair["question"] for qa_pair in self.qa_data]
+        if not table.covers(questions):
+            print("Paraphrase table does not match the QA data, rebuilding it")
+            table.build(questions)
+        for question in questions[table.size:]:
+            table.add(question)
+    
+    def _index_question(self, question, qa_index):
+        """
+        Add a single question, and its synonym variants if enabled, to the search index.
+        
+        Args:
+            question (str): The question to index
+            qa_index (int): Position of the question-answer pair in qa_data
+        """
+        processed_question = self.preprocess_text(question)
+        self._index_entry(processed_question, qa_index)
+        if self.synonym_variants:
+            for variant in self.canonicalizer.variants(processed_question, self.synonym_variants):
+                self._index_entry(variant, qa_index)
+    
+    def _index_entry(self, processed_question, qa_index):
+        """
+        Add one preprocessed text pointing to a question-answer pair to the search index.
+        
+        Args:
+            processed_question (str): Preprocessed question or variant
+            qa_index (int): Position of the question-answer pair in qa_data
+        """
+        self._processed_questions.append(processed_question)
+        self._entry_qa_indices.append(qa_index)
+        # The stored question is seq2 so its b2j lookup table is built only once
+        self._matchers.append(SequenceMatcher(None, '', processed_question))
+        index = len(self._processed_questions) - 1
+        # The first occurrence wins, like the lower index does on score ties
+        self._exact_questions.setdefault(processed_question, index)
+        for token in set(processed_question.split()) - STOPWORDS:
+            self._token_postings.setdefault(token, []).append(index)
+        self._length_buckets.setdefault(len(processed_question), []).append(index)
+        if self._histograms is not None:
+            self._histograms.add(processed_question)
     
     def preprocess_text(self, text):
         """
         Clean and normalize text for better matching.
         
+        With synonyms configured, synonym phrases are also rewritten to their
+        canonical form in the same pass.
+        
         Args:
             text (str): Input text to process
             
         Returns:
             str: Processed text
         """
-        # Convert to lowercase
-        text = text.lower()
-        # Remove punctuation
-        text = re.sub(r'[^\w\s]', '', text)
-        # Remove extra whitespace
-        text = ' '.join(text.split())
+        text = normalize_text(text)
+        if self.canonicalizer is not None and not self.synonym_variants:
+            text = self.canonicalizer.canonicalize(text)
         return text
     
-    def calculate_similarity(self, text1, text2):
+    def calculate_similarity(self, text1, text2, min_score=None):
         """
         Calculate similarity between two strings using SequenceMatcher.
         
         Args:
             text1 (str): First string
             text2 (str): Second string
+            min_score (float): Optional score the result has to reach; pairs that
+                               cannot reach it are rejected by cheap bounds
             
         Returns:
-            float: Similarity score between 0 and 1
+            float: Similarity score between 0 and 1, or 0.0 if below min_score
         """
-        return SequenceMatcher(None, text1, text2).ratio()
+        return cascaded_ratio(SequenceMatcher(None, text1, text2), min_score)
     
-    def find_best_match(self, user_question):
+    def rank_questions(self, user_question, n=5, suggest_on_match=True):
         """
-        Find the best matching question in the dataset.
+        Score the dataset once and return both the best match and the closest questions.
         
         Args:
             user_question (str): The question asked by the user
+            n (int): Number of similar questions to return
+            suggest_on_match (bool): If False, similar questions are only collected when
+                                     no match clears the threshold, which lets exact
+                                     matches skip fuzzy scoring altogether
             
         Returns:
-            tuple: (best_match_question, best_match_answer, similarity_score)
-                  or (None, None, 0) if no match found above threshold
+            tuple: (best_match_question, best_match_answer, similarity_score, similar_questions)
+                  where the first three follow find_best_match and similar_questions
+                  follows find_similar_questions
         """
         if not self.qa_data:
-            return None, None, 0
+            return None, None, 0, []
         
         # Preprocess the user question
         processed_question = self.preprocess_text(user_question)
+        # Exact and paraphrase matches are definite, so a lossy cache key must not override them
+        if (self.query_cache is None or processed_question in self._exact_questions
+                or self._lookup_paraphrase(processed_question) is not None):
+            return self._rank_processed(processed_question, n, suggest_on_match)
+        
+        # Repeated questions are answered without re-scanning the knowledge base;
+        # queries preprocess_text already canonicalized are not rewritten again
+        params = (n, suggest_on_match, self.similarity_threshold)
+        key, cached = self.query_cache.lookup(processed_question, params, self.kb_version,
+                                              self.canonicalizer if self.synonym_variants else None)
+        if cached is None:
+            result = self._rank_processed(processed_question, n, suggest_on_match)
+            cached = result[:3] + (tuple(result[3]),)
+            self.query_cache.put(key, cached, self.kb_version)
+        return cached[:3] + (list(cached[3]),)
+    
+    def _rank_processed(self, processed_question, n, suggest_on_match):
+        """
+        Rank the stored questions for an already preprocessed user question.
+        
+        Args:
+            processed_question (str): Preprocessed user question
+            n (int): Number of similar questions to return
+            suggest_on_match (bool): See rank_questions
+            
+        Returns:
+            tuple: Same as rank_questions
+        """
+        # A synonym-equivalent stored question is a perfect match found by one hash probe
+        paraphrase_index = self._lookup_paraphrase(processed_question)
+        if paraphrase_index is not None:
+            self.stats["paraphrase_hits"] += 1
+            if not suggest_on_match or n <= 0:
+                qa_pair = self.qa_data[paraphrase_index]
+                return qa_pair["question"], qa_pair["answer"], 1.0, []
+        
+        # A separate suggestion engine leaves only the best match to the main scan
+        k = 1 if self.suggestion_engine is not None else max(n, 1)
+        exact_is_final = k == 1 or (not suggest_on_match and 1.0 >= self.similarity_threshold)
+        ranked = self._score_questions(processed_question, k, exact_is_final)
         
         best_match = None
         best_score = 0
         best_answer = None
+        if paraphrase_index is not None:
+            best_qa_pair = self.qa_data[paraphrase_index]
+            best_match = best_qa_pair["question"]
+            best_answer = best_qa_pair["answer"]
+            best_score = 1.0
+        # Engines may return nothing when no stored question shares a term with the query
+        elif ranked and ranked[0][1] > best_score:
+            best_entry, best_score = ranked[0]
+            best_qa_pair = self.qa_data[self._entry_qa_indices[best_entry]]
+            best_match = best_qa_pair["question"]
+            best_answer = best_qa_pair["answer"]
+        is_match = best_score >= self.similarity_threshold
         
-        for qa_pair in self.qa_data:
-            question = qa_pair["question"]
-            processed_stored_question = self.preprocess_text(question)
+        if is_match and not suggest_on_match:
+            similar_questions = []
+        elif self.suggestion_engine is not None:
+            top = TopKSelector(n, self._entry_qa_indices)
+            if n > 0:
+                for entry, score in self.suggestion_engine.search(processed_question, self._entry_budget(n)):
+                    top.push(score, entry)
+            similar_questions = self._qa_questions(top.items())
+        else:
+            similar_questions = self._qa_questions(ranked[:n])
+        
+        # Only report the best match if above threshold
+        if is_match:
+            return best_match, best_answer, best_score, similar_questions
+        else:
+            return None, None, best_score, similar_questions
+    
+    def _lookup_paraphrase(self, processed_question):
+        """
+        Find the stored question a preprocessed query is a synonym-equivalent paraphrase of.
+        
+        Args:
+            processed_question (str): Preprocessed user question
             
-            # Calculate similarity
-            similarity = self.calculate_similarity(processed_question, processed_stored_question)
+        Returns:
+            int: Position of the question-answer pair in qa_data, or None
+        """
+        if self.paraphrase_table is None or 1.0 < self.similarity_threshold:
+            return None
+        # preprocess_text already produced the table's canonical form, unless it skips synonyms
+        canonical = self.paraphrase_table.canonicalizer is self.canonicalizer and not self.synonym_variants
+        return self.paraphrase_table.lookup(processed_question, canonical)
+    
+    def _qa_questions(self, ranked):
+        """
+        Map ranked (entry, score) tuples to (question, score) tuples.
+        """
+        return [(self.qa_data[self._entry_qa_indices[entry]]["question"], score) for entry, score in ranked]
+    
+    def _entry_budget(self, k):
+        """
+        Number of entries to request from an engine to cover k distinct questions.
+        """
+        return k * (1 + self.synonym_variants)
+    
+    def _score_questions(self, processed_question, k, exact_is_final):
+        """
+        Rank the stored questions for a preprocessed query with the configured engine.
+        
+        Args:
+            processed_question (str): Preprocessed user question
+            k (int): Number of top questions to keep
+            exact_is_final (bool): Whether an exact match makes further scoring pointless
             
-            if similarity > best_score:
-                best_score = similarity
-                best_match = question
-                best_answer = qa_pair["answer"]
-        
-        # Return the best match if above threshold
-        if best_score >= self.similarity_threshold:
-            return best_match, best_answer, best_score
+        Returns:
+            list: List of tuples (entry, score) sorted by descending score, at most
+                  one entry per question-answer pair
+        """
+        # Keep only the top candidates while scoring every question at most once
+        top = TopKSelector(k, self._entry_qa_indices if self.synonym_variants else None)
+        self.stats["queries"] += 1
+        exact_index = self._exact_questions.get(processed_question)
+        if exact_index is not None and exact_is_final:
+            # Identical normalized text is a perfect SequenceMatcher score
+            self.stats["exact_hits"] += 1
+            top.push(1.0, exact_index)
+        elif self.engine is not None:
+            for entry, score in self.engine.search(processed_question, self._entry_budget(top.k)):
+                top.push(score, entry)
         else:
-            return None, None, best_score
+            candidates = self._token_candidates(processed_question) if self.token_prefilter else None
+            if self._histograms is not None:
+                self._scan_histogram_bounds(processed_question, top, candidates)
+            else:
+                self._scan_length_buckets(processed_question, top, candidates)
+        return top.items()
+    
+    def _token_candidates(self, processed_question):
+        """
+        Collect the stored questions sharing at least one non-stopword with the query.
+        
+        Args:
+            processed_question (str): Preprocessed user question
+            
+        Returns:
+            list: Sorted indices of the candidates, or None to scan every question
+        """
+        candidates = set()
+        for token in set(processed_question.split()) - STOPWORDS:
+            candidates.update(self._token_postings.get(token, ()))
+        if not candidates:
+            return None
+        
+        self.stats["skipped_by_tokens"] += len(self._processed_questions) - len(candidates)
+        return sorted(candidates)
+    
+    def _scan_length_buckets(self, processed_question, top, candidates=None):
+        """
+        Score stored questions bucket by bucket, skipping buckets that cannot enter the selection.
+        
+        SequenceMatcher.ratio() is at most 2 * min(len_a, len_b) / (len_a + len_b), so
+        buckets are visited from the most to the least promising length and the scan
+        stops as soon as that bound falls below the selection's cutoff.
+        
+        Args:
+            processed_question (str): Preprocessed user question
+            top (TopKSelector): Selection receiving (score, index) entries
+            candidates (list): Optional indices to restrict the scan to
+        """
+        query_length = len(processed_question)
+        buckets = self._length_buckets
+        if candidates is not None:
+            buckets = {}
+            for index in candidates:
+                buckets.setdefault(len(self._processed_questions[index]), []).append(index)
+        
+        bounded_buckets = []
+        for length, indices in buckets.items():
+            total = query_length + length
+            bound = 2.0 * min(query_length, length) / total if total else 1.0
+            bounded_buckets.append((bound, length, indices))
+        bounded_buckets.sort(reverse=True)
+        
+        for position, (bound, length, indices) in enumerate(bounded_buckets):
+            if bound < top.cutoff:
+                self.stats["skipped_by_length"] += sum(
+                    len(skipped) for _, _, skipped in bounded_buckets[position:]
+                )
+                break
+            
+            self.stats["entries_visited"] += len(indices)
+            for index in indices:
+                matcher = self._matchers[index]
+                matcher.set_seq1(processed_question)
+                # Entries that cannot beat the current cutoff are rejected by cheap bounds
+                similarity = cascaded_ratio(matcher, top.cutoff)
+                top.push(similarity, index)
+    
+    def _scan_histogram_bounds(self, processed_question, top, candidates=None, chunk_size=256):
+        """
+        Score stored questions in order of their character-histogram bound.
+        
+        The bounds for the whole dataset come from one NumPy operation; only entries
+        whose bound can still enter the selection are handed to SequenceMatcher.
+        
+        Args:
+            processed_question (str): Preprocessed user question
+            top (TopKSelector): Selection receiving (score, index) entries
+            candidates (list): Optional indices to restrict the scan to
+            chunk_size (int): Number of entries converted to Python objects at a time
+        """
+        rows = None if candidates is None else np.asarray(candidates, dtype=np.int64)
+        bounds = self._histograms.upper_bounds(processed_question, rows)
+        positions = np.argsort(-bounds, kind="stable")
+        order = positions if rows is None else rows[positions]
+        bounds = bounds[positions]
+        
+        for start in range(0, len(order), chunk_size):
+            chunk = slice(start, start + chunk_size)
+            for offset, (index, bound) in enumerate(zip(order[chunk].tolist(), bounds[chunk].tolist())):
+                if bound < top.cutoff:
+                    self.stats["skipped_by_histogram"] += len(order) - start - offset
+                    return
+                
+                self.stats["entries_visited"] += 1
+                matcher = self._matchers[index]
+                matcher.set_seq1(processed_question)
+                top.push(cascaded_ratio(matcher, top.cutoff), index)
+    
+    def find_best_match(self, user_question):
+        """
+        Find the best matching question in the dataset.
+        
+        Args:
+            user_question (str): The question asked by the user
+            
+        Returns:
+            tuple: (best_match_question, best_match_answer, similarity_score)
+                  or (None, None, 0) if no match found above threshold
+        """
+        best_match, best_answer, best_score, _ = self.rank_questions(user_question, n=0)
+        return best_match, best_answer, best_score
     
     def find_similar_questions(self, user_question, n=5):
         """
@@ -100,23 +562,7 @@ class KomodoTourChatbot:
         Returns:
             list: List of tuples (question, similarity_score) sorted by similarity
         """
-        if not self.qa_data:
-            return []
-        
-        # Preprocess the user question
-        processed_question = self.preprocess_text(user_question)
-        
-        # Calculate similarity for all questions
-        similarities = []
-        for qa_pair in self.qa_data:
-            question = qa_pair["question"]
-            processed_stored_question = self.preprocess_text(question)
-            similarity = self.calculate_similarity(processed_question, processed_stored_question)
-            similarities.append((question, similarity))
-        
-        # Sort by similarity (descending) and return top n
-        similarities.sort(key=lambda x: x[1], reverse=True)
-        return similarities[:n]
+        return self.rank_questions(user_question, n=n)[3]
     
     def save_qa_data(self, file_path):
         """
@@ -132,6 +578,23 @@ class KomodoTourChatbot:
         except Exception as e:
             print(f"Error saving QA data: {e}")
     
+    def reload_qa_data(self, file_path):
+        """
+        Replace the QA data with the content of a JSON file and rebuild the index.
+        
+        Args:
+            file_path (str): Path of a JSON file written by save_qa_data
+        """
+        try:
+            with open(file_path, 'r', encoding='utf-8') as file:
+                qa_data = json.load(file)
+        except (OSError, ValueError) as e:
+            print(f"Error loading QA data: {e}")
+            return
+        self.qa_data = qa_data
+        self.build_index()
+        print(f"QA data reloaded from {file_path}")
+    
     def add_qa_pair(self, question, answer):
         """
         Add a new question-answer pair to the dataset.
@@ -141,6 +604,18 @@ class KomodoTourChatbot:
             answer (str): The corresponding answer
         """
         self.qa_data.append({"question": question, "answer": answer})
+        self.kb_version += 1
+        first_entry = len(self._processed_questions)
+        self._index_question(question, len(self.qa_data) - 1)
+        for engine in (self.engine, self.suggestion_engine):
+            if engine is not None:
+                for processed_question in self._processed_questions[first_entry:]:
+                    engine.add(processed_question)
+        if self.paraphrase_table is not None:
+            if self.paraphrase_table.size == len(self.qa_data) - 1:
+                self.paraphrase_table.add(question)
+            else:
+                self._sync_paraphrase_table()
         print("New QA pair added successfully!")
     
     def run(self):
@@ -160,15 +635,16 @@ class KomodoTourChatbot:
                 print("Thank you for chatting with us! Have a great day!")
                 break
             
-            # Find the best match for the user's question
-            best_match, answer, similarity = self.find_best_match(user_input)
+            # Find the best match and fallback suggestions in a single pass
+            best_match, answer, similarity, similar_questions = self.rank_questions(
+                user_input, suggest_on_match=False
+            )
             
             # If a good match is found, provide the answer
             if best_match and answer:
                 print(f"\nChatbot: {answer}")
             else:
                 print("\nChatbot: I'm not sure I understand your question. Did you mean one of these?")
-                similar_questions = self.find_similar_questions(user_input)
                 
                 for i, (question, sim) in enumerate(similar_questions, 1):
                     print(f"{i}. {question}")
@@ -289,8 +765,15 @@ def main():
     # with open('komodo_qa_data.json', 'w', encoding='utf-8') as f:
     #     json.dump(qa_data, f, indent=4)
     
-    # Initialize the chatbot with the data
-    chatbot = KomodoTourChatbot(qa_data=qa_data, similarity_threshold=0.6)
+    # Initialize the chatbot with the data, understanding the synonyms shipped next to this file
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    synonyms_path = os.path.join(base_dir, 'synonyms.json')
+    # Built offline with paraphrases.py; otherwise the table is built at startup
+    paraphrases_path = os.path.join(base_dir, 'paraphrases.json')
+    chatbot = KomodoTourChatbot(qa_data=qa_data, similarity_threshold=0.6,
+                                synonyms=synonyms_path if os.path.exists(synonyms_path) else None,
+                                paraphrase_table=paraphrases_path if os.path.exists(paraphrases_path) else True,
+                                query_cache=True)
     
     # Run the chatbot
     chatbot.run()
@@ -0,0 +1,241 @@
+"""
+Materialized paraphrase lookup table.
+
+Every stored question is normalized, rewritten to its canonical synonym form and
+hashed once, offline. At query time a single dictionary probe tells whether the
+user question is a synonym-equivalent paraphrase of a stored question, before any
+fuzzy scoring runs.
+
+Build the table file ahead of time with:
+
+    python paraphrases.py komodo_qa_data.json synonyms.json paraphrases.json
+"""
+
+import hashlib
+import json
+import os
+import sys
+import tempfile
+
+from synonyms import SynonymCanonicalizer
+from text_processing import normalize_text
+
+
+def synonyms_fingerprint(canonicalizer):
+    """
+    Identify the synonym configuration a table was built with.
+    
+    Args:
+        canonicalizer (SynonymCanonicalizer): Canonicalizer, or None for plain normalization
+        
+    Returns:
+        str: Hex digest of the phrase -> canonical phrase mapping
+    """
+    replacements = sorted(canonicalizer.replacements.items()) if canonicalizer is not None else []
+    return hashlib.sha1(json.dumps(replacements).encode('utf-8')).hexdigest()
+
+
+class ParaphraseTable:
+    """
+    Hash table from canonical question forms to question-answer pair positions.
+    
+    Only 64-bit hashes of the canonical forms are kept, not the texts themselves.
+    When two questions share a canonical form, the first one wins, like the lower
+    index does on score ties. A hash of every question, by position, records
+    which qa_data the table was built from, so a table is never applied to
+    questions that were edited or reordered since.
+    """
+    
+    def __init__(self, canonicalizer=None):
+        """
+        Create an empty table.
+        
+        Args:
+            canonicalizer (SynonymCanonicalizer): Canonicalizer applied to every text,
+                                                  or None for plain normalization
+        """
+        self.canonicalizer = canonicalizer
+        self.fingerprint = synonyms_fingerprint(canonicalizer)
+        # canonical form hash -> position in qa_data
+        self._answers = {}
+        # Hash of the question at every position of qa_data covered so far
+        self._questions = []
+    
+    def __len__(self):
+        return len(self._answers)
+    
+    @property
+    def size(self):
+        """
+        int: Number of questions of qa_data covered so far.
+        """
+        return len(self._questions)
+    
+    @staticmethod
+    def _hash(text):
+        """
+        64-bit hash of a string.
+        """
+        return int.from_bytes(hashlib.sha1(text.encode('utf-8')).digest()[:8], 'big')
+    
+    def key(self, text, canonical=False):
+        """
+        Hash the canonical form of a text.
+        
+        Args:
+            text (str): Raw or already preprocessed text
+            canonical (bool): Whether text was already canonicalized with this
+                              table's canonicalizer, which is then skipped
+            
+        Returns:
+            int: 64-bit hash of the canonical form
+        """
+        if not canonical:
+            text = normalize_text(text)
+            if self.canonicalizer is not None:
+                text = self.canonicalizer.canonicalize(text)
+        return self._hash(text)
+    
+    def add(self, question):
+        """
+        Add the next question of qa_data.
+        
+        Args:
+            question (str): The question at position self.size of qa_data
+        """
+        self._answers.setdefault(self.key(question), self.size)
+        self._questions.append(self._hash(question))
+    
+    def build(self, questions):
+        """
+        Replace the content of the table with the given questions.
+        
+        Args:
+            questions (list): Questions in qa_data order
+        """
+        self._answers = {}
+        self._questions = []
+        for question in questions:
+            self.add(question)
+    
+    def covers(self, questions):
+        """
+        Check that the table was built from a prefix of the given questions.
+        
+        Args:
+            questions (list): Questions in qa_data order
+            
+        Returns:
+            bool: True if every position the table covers holds the same question
+        """
+        if self.size > len(questions):
+            return False
+        return all(self._hash(question) == stored for question, stored in zip(questions, self._questions))
+    
+    def lookup(self, text, canonical=False):
+        """
+        Find the stored question a text is a paraphrase of.
+        
+        Args:
+            text (str): Raw or already preprocessed text
+            canonical (bool): See key()
+            
+        Returns:
+            int: Position of the question-answer pair in qa_data, or None
+        """
+        return self._answers.get(self.key(text, canonical))
+    
+    def save(self, file_path):
+        """
+        Write the table to a JSON file.
+        
+        The file is written under a temporary name and then atomically replaced, so
+        a concurrent reader or an interrupted write never sees a partial table.
+        
+        Args:
+            file_path (str): Path where to save the table
+        """
+        data = {
+            "synonyms": self.fingerprint,
+            "questions": ["%016x" % question for question in self._questions],
+            "keys": ["%016x" % key for key in self._answers],
+            "answers": list(self._answers.values()),
+        }
+        try:
+            directory = os.path.dirname(os.path.abspath(file_path))
+            descriptor, temporary_path = tempfile.mkstemp(suffix=".tmp", prefix=os.path.basename(file_path) + "-",
+                                                          dir=directory)
+            with os.fdopen(descriptor, 'w', encoding='utf-8') as file:
+                json.dump(data, file, separators=(',', ':'))
+            os.replace(temporary_path, file_path)
+            print(f"Paraphrase table saved to {file_path}")
+        except OSError as e:
+            print(f"Error saving paraphrase table: {e}")
+    
+    @classmethod
+    def load(cls, file_path, canonicalizer=None):
+        """
+        Read a table written by save().
+        
+        A table built with different synonyms, or a file that cannot be read, is
+        returned empty, so the caller rebuilds it instead of answering with stale
+        canonical forms.
+        
+        Args:
+            file_path (str): Path of the saved table
+            canonicalizer (SynonymCanonicalizer): The canonicalizer queries will use
+            
+        Returns:
+            ParaphraseTable: The loaded table
+        """
+        table = cls(canonicalizer)
+        try:
+            with open(file_path, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+            fingerprint = data["synonyms"]
+            answers = {int(key, 16): answer for key, answer in zip(data["keys"], data["answers"])}
+            questions = [int(question, 16) for question in data["questions"]]
+            if not all(isinstance(answer, int) and 0 <= answer < len(questions) for answer in answers.values()):
+                raise ValueError("answer positions out of range")
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Ignoring unreadable paraphrase table {file_path}: {e}")
+            return table
+        if fingerprint != table.fingerprint:
+            print(f"Paraphrase table {file_path} was built with other synonyms, ignoring it")
+            return table
+        table._answers = answers
+        table._questions = questions
+        return table
+
+
+def build_table_file(qa_path, synonyms_path, output_path):
+    """
+    Offline build step: canonicalize every question of a QA file and save the table.
+    
+    Args:
+        qa_path (str): Path of the QA data JSON file
+        synonyms_path (str): Path of the synonyms.json file
+        output_path (str): Path where to save the table
+        
+    Returns:
+        ParaphraseTable: The built table
+    """
+    with open(qa_path, 'r', encoding='utf-8') as file:
+        qa_data = json.load(file)
+    canonicalizer = SynonymCanonicalizer.from_file(synonyms_path) if os.path.exists(synonyms_path) else None
+    table = ParaphraseTable(canonicalizer)
+    table.build(qa_pair["question"] for qa_pair in qa_data)
+    table.save(output_path)
+    return table
+
+
+def main():
+    """Build a paraphrase table from the command line."""
+    if len(sys.argv) != 4:
+        print("Usage: python paraphrases.py QA_DATA.json SYNONYMS.json OUTPUT.json")
+        sys.exit(1)
+    build_table_file(*sys.argv[1:])
+
+
+if __name__ == "__main__":
+    main()
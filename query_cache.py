@@ -0,0 +1,284 @@
+"""
+Least-recently-used cache for chatbot query results.
+
+Entries are tagged with the knowledge-base version they were computed for; the
+first lookup with a newer version drops everything, so answers never outlive
+the questions they were ranked against.
+
+A key policy decides which questions share a cache entry, e.g. "canonical" lets
+"price for children?" reuse the result of "children price". Shadow policies only
+track the keys they would have produced, to compare hit rates on real traffic.
+"""
+
+import sys
+from collections import OrderedDict
+
+from text_processing import STOPWORDS
+
+
+def estimate_size(value):
+    """
+    Approximate the memory held by a cached key or result.
+    
+    Args:
+        value: String, number, None or a tuple/list of those
+        
+    Returns:
+        int: Size in bytes, containers included
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, (tuple, list)):
+        size += sum(estimate_size(item) for item in value)
+    return size
+
+
+class CacheKeyPolicy:
+    """
+    Rule turning a preprocessed question into a cache key.
+    """
+    
+    def __init__(self, name, synonyms=False, remove_stopwords=False, sort_tokens=False):
+        """
+        Create a policy.
+        
+        Args:
+            name (str): Name reported in the hit-rate comparison
+            synonyms (bool): Rewrite synonym phrases to their canonical form
+            remove_stopwords (bool): Drop stopwords, unless nothing else is left
+            sort_tokens (bool): Ignore word order
+        """
+        self.name = name
+        self.synonyms = synonyms
+        self.remove_stopwords = remove_stopwords
+        self.sort_tokens = sort_tokens
+    
+    def key(self, processed_question, canonicalizer=None):
+        """
+        Compute the cache key of a question.
+        
+        Args:
+            processed_question (str): Question after preprocess_text
+            canonicalizer (SynonymCanonicalizer): Synonyms to apply, if the policy uses
+                                                  them; None when preprocess_text
+                                                  already applied them
+            
+        Returns:
+            str: Cache key
+        """
+        if self.synonyms and canonicalizer is not None:
+            processed_question = canonicalizer.canonicalize(processed_question)
+        tokens = processed_question.split()
+        if self.remove_stopwords:
+            tokens = [token for token in tokens if token not in STOPWORDS] or tokens
+        if self.sort_tokens:
+            tokens.sort()
+        return ' '.join(tokens)
+
+
+KEY_POLICIES = {
+    "exact": CacheKeyPolicy("exact"),
+    "synonyms": CacheKeyPolicy("synonyms", synonyms=True),
+    "bag_of_words": CacheKeyPolicy("bag_of_words", remove_stopwords=True, sort_tokens=True),
+    "canonical": CacheKeyPolicy("canonical", synonyms=True, remove_stopwords=True, sort_tokens=True),
+}
+
+
+def get_policy(policy):
+    """
+    Resolve a key policy given by name.
+    
+    Args:
+        policy (str or CacheKeyPolicy): Name from KEY_POLICIES or a policy instance
+        
+    Returns:
+        CacheKeyPolicy: The policy
+    """
+    if isinstance(policy, CacheKeyPolicy):
+        return policy
+    try:
+        return KEY_POLICIES[policy]
+    except KeyError:
+        raise ValueError(f"Unknown cache key policy {policy!r}, expected one of {sorted(KEY_POLICIES)}") from None
+
+
+class ShadowKeys:
+    """
+    Keys-only LRU replaying the lookups under another key policy.
+    
+    Only the entry bound applies, since no results are stored to measure bytes.
+    """
+    
+    def __init__(self, policy, max_entries):
+        """
+        Create an empty shadow.
+        
+        Args:
+            policy (CacheKeyPolicy): Policy producing the keys
+            max_entries (int): Maximum number of remembered keys
+        """
+        self.policy = policy
+        self.max_entries = max_entries
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self._keys = OrderedDict()
+    
+    def observe(self, key, version):
+        """
+        Count a lookup as a hit or a miss and remember its key.
+        
+        Args:
+            key: Key under this shadow's policy
+            version (int): Current knowledge-base version
+        """
+        if version != self.version:
+            self._keys.clear()
+            self.version = version
+        if key in self._keys:
+            self.hits += 1
+            self._keys.move_to_end(key)
+            return
+        self.misses += 1
+        self._keys[key] = None
+        if len(self._keys) > self.max_entries:
+            self._keys.popitem(last=False)
+    
+    def hit_rate(self):
+        """
+        Share of lookups that would have been answered from the cache.
+        
+        Returns:
+            float: Hits divided by lookups, 0.0 before the first lookup
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class QueryCache:
+    """
+    LRU mapping from query keys to results, bounded by entry count and bytes.
+    """
+    
+    def __init__(self, max_entries=1024, max_bytes=4 * 1024 * 1024, key_policy="exact",
+                 shadow_policies=()):
+        """
+        Create an empty cache.
+        
+        Args:
+            max_entries (int): Maximum number of cached results
+            max_bytes (int): Maximum estimated size of the keys and results together
+            key_policy (str or CacheKeyPolicy): Policy keying the cached results; looser
+                                                policies answer more questions from the
+                                                cache with the result of an equivalent one
+            shadow_policies (list): Further policies whose hit rates are only measured
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.key_policy = get_policy(key_policy)
+        self.shadows = [ShadowKeys(get_policy(policy), max_entries) for policy in shadow_policies]
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes = 0
+        # key -> (result, size), least recently used first
+        self._entries = OrderedDict()
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def clear(self):
+        """
+        Drop every cached result, keeping the counters.
+        """
+        self._entries.clear()
+        self.bytes = 0
+    
+    def lookup(self, processed_question, params, version, canonicalizer=None):
+        """
+        Key a question under the cache's policy and look up its result.
+        
+        Every shadow policy observes the lookup as well.
+        
+        Args:
+            processed_question (str): Question after preprocess_text
+            params (tuple): Further arguments the result depends on
+            version (int): Current knowledge-base version
+            canonicalizer (SynonymCanonicalizer): Synonyms for policies using them
+            
+        Returns:
+            tuple: (key, cached result or None); pass the key to put() on a miss
+        """
+        for shadow in self.shadows:
+            shadow.observe((shadow.policy.key(processed_question, canonicalizer),) + params, version)
+        key = (self.key_policy.key(processed_question, canonicalizer),) + params
+        return key, self.get(key, version)
+    
+    def get(self, key, version):
+        """
+        Look up a result and mark it as recently used.
+        
+        Args:
+            key: Hashable query key
+            version (int): Current knowledge-base version
+            
+        Returns:
+            The cached result, or None on a miss
+        """
+        if version != self.version:
+            self.clear()
+            self.version = version
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry[0]
+    
+    def put(self, key, result, version):
+        """
+        Store a result, evicting the least recently used ones beyond the bounds.
+        
+        Args:
+            key: Hashable query key
+            result: Result to cache; must not be mutated afterwards
+            version (int): Knowledge-base version the result was computed for
+        """
+        if version != self.version:
+            self.clear()
+            self.version = version
+        size = estimate_size(key) + estimate_size(result)
+        if size > self.max_bytes or self.max_entries <= 0:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.bytes -= previous[1]
+        self._entries[key] = (result, size)
+        self.bytes += size
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self.bytes -= evicted_size
+            self.evictions += 1
+    
+    def hit_rate(self):
+        """
+        Share of lookups answered from the cache.
+        
+        Returns:
+            float: Hits divided by lookups, 0.0 before the first lookup
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+    
+    def policy_hit_rates(self):
+        """
+        Compare the hit rate of the key policy with those of the shadow policies.
+        
+        Returns:
+            dict: Policy name -> hit rate
+        """
+        rates = {self.key_policy.name: self.hit_rate()}
+        for shadow in self.shadows:
+            rates.setdefault(shadow.policy.name, shadow.hit_rate())
+        return rates
@@ -0,0 +1,215 @@
+"""
+Synonym canonicalization driven by synonyms.json.
+
+synonyms.json maps a canonical phrase to its variants. All phrases are normalized
+like the chatbot's questions and compiled into a word-level Aho-Corasick automaton,
+so a text is rewritten to canonical phrases in a single pass over its words.
+"""
+
+import itertools
+import json
+from collections import deque
+
+from text_processing import normalize_text
+
+
+class SynonymCanonicalizer:
+    """
+    Rewrite synonym phrases to their canonical form, leftmost-longest match first.
+    
+    Canonical phrases are patterns of their own, so "same day booking" stays intact
+    instead of having "same day" rewritten inside it. When a variant is listed
+    under several canonical phrases, the first one in the file wins. A rewrite can
+    form a new phrase ("reserve now" -> "book now" -> "same day booking"), so texts
+    are rewritten until they no longer change, making canonicalize() idempotent.
+    """
+    
+    # Upper bound on rewrite passes, in case synonyms.json contains a cycle
+    MAX_PASSES = 8
+    
+    def __init__(self, synonyms):
+        """
+        Compile the automaton.
+        
+        Args:
+            synonyms (dict): Canonical phrase -> list of variant phrases
+        """
+        self.replacements = {}
+        # canonical phrase -> the canonical phrase followed by its variants
+        self.groups = {}
+        for canonical, variants in synonyms.items():
+            canonical = normalize_text(canonical)
+            group = self.groups.setdefault(canonical, [])
+            for phrase in [canonical] + list(variants):
+                phrase = normalize_text(phrase)
+                if phrase and phrase not in self.replacements:
+                    self.replacements[phrase] = canonical
+                if phrase and phrase not in group:
+                    group.append(phrase)
+        # phrase -> key of its group in groups, before targets are resolved by _build
+        self._group_of = dict(self.replacements)
+        self._build()
+    
+    @classmethod
+    def from_file(cls, file_path):
+        """
+        Load a synonyms.json-style file.
+        
+        Args:
+            file_path (str): Path to the JSON file
+            
+        Returns:
+            SynonymCanonicalizer: The compiled canonicalizer
+        """
+        with open(file_path, 'r', encoding='utf-8') as file:
+            return cls(json.load(file))
+    
+    def _build(self):
+        """
+        Build the goto, failure and output functions over words.
+        """
+        # node -> {word: child node}
+        self._goto = [{}]
+        # node -> words in the patterns ending at this node (own and via failure links)
+        self._outputs = [[]]
+        for phrase in self.replacements:
+            node = 0
+            for word in phrase.split():
+                child = self._goto[node].get(word)
+                if child is None:
+                    child = self._goto[node][word] = len(self._goto)
+                    self._goto.append({})
+                    self._outputs.append([])
+                node = child
+            self._outputs[node].append(phrase)
+        
+        self._fail = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for word, child in self._goto[node].items():
+                fallback = self._fail[node]
+                while fallback and word not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(word, 0)
+                self._fail[child] = target if target != child else 0
+                self._outputs[child] = self._outputs[child] + self._outputs[self._fail[child]]
+                queue.append(child)
+        
+        # Rewrite every target to a fixed point, e.g. a canonical phrase that is itself a variant
+        for phrase, target in self.replacements.items():
+            self.replacements[phrase] = self.canonicalize(target)
+    
+    def find(self, words):
+        """
+        Find every synonym phrase occurring in a list of words.
+        
+        Args:
+            words (list): Words of a normalized text
+            
+        Returns:
+            list: Tuples (start, length, phrase), leftmost first and longest first
+        """
+        matches = []
+        node = 0
+        for end, word in enumerate(words):
+            while node and word not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(word, 0)
+            for phrase in self._outputs[node]:
+                length = phrase.count(' ') + 1
+                matches.append((end - length + 1, length, phrase))
+        matches.sort(key=lambda match: (match[0], -match[1]))
+        return matches
+    
+    def _non_overlapping(self, words):
+        """
+        Leftmost-longest synonym matches that do not overlap.
+        """
+        selected = []
+        position = 0
+        for start, length, phrase in self.find(words):
+            if start >= position:
+                selected.append((start, length, phrase))
+                position = start + length
+        return selected
+    
+    def variants(self, text, limit):
+        """
+        Generate paraphrases of a normalized text by swapping synonym phrases.
+        
+        Single substitutions come first, cycling through the matched phrases so
+        every phrase gets a turn, followed by combinations of substitutions, until
+        limit distinct variants have been produced.
+        
+        Args:
+            text (str): Text normalized with normalize_text
+            limit (int): Maximum number of variants
+            
+        Returns:
+            list: Variant texts, not including text itself
+        """
+        words = text.split()
+        matches = self._non_overlapping(words)
+        options = [[phrase] + [alternative for alternative in self.groups[self._group_of[phrase]]
+                               if alternative != phrase]
+                   for _, _, phrase in matches]
+        
+        def render(choices):
+            result = []
+            position = 0
+            for (start, length, _), choice in zip(matches, choices):
+                result.extend(words[position:start])
+                result.append(choice)
+                position = start + length
+            result.extend(words[position:])
+            return ' '.join(result)
+        
+        originals = [choices[0] for choices in options]
+        singles = []
+        for depth in range(1, max((len(choices) for choices in options), default=0)):
+            for slot, choices in enumerate(options):
+                if depth < len(choices):
+                    singles.append(originals[:slot] + [choices[depth]] + originals[slot + 1:])
+        
+        variants = []
+        seen = {text}
+        for choices in itertools.chain(singles, itertools.product(*options)):
+            if len(variants) >= limit:
+                break
+            variant = render(choices)
+            if variant not in seen:
+                seen.add(variant)
+                variants.append(variant)
+        return variants
+    
+    def canonicalize(self, text):
+        """
+        Rewrite every synonym phrase of a normalized text to its canonical phrase.
+        
+        Args:
+            text (str): Text normalized with normalize_text
+            
+        Returns:
+            str: Canonicalized text
+        """
+        for _ in range(self.MAX_PASSES):
+            rewritten = self._rewrite(text)
+            if rewritten == text:
+                break
+            text = rewritten
+        return text
+    
+    def _rewrite(self, text):
+        """
+        Rewrite the leftmost-longest synonym phrases once.
+        """
+        words = text.split()
+        result = []
+        position = 0
+        for start, length, phrase in self._non_overlapping(words):
+            result.extend(words[position:start])
+            result.append(self.replacements[phrase])
+            position = start + length
+        result.extend(words[position:])
+        return ' '.join(result)
@@ -0,0 +1,109 @@
+"""
+Check the on-disk embedding cache.
+"""
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from embeddings import EmbeddingCache, HashingEncoder  # noqa: E402
+from engines import EmbeddingEngine  # noqa: E402
+
+
+class CountingEncoder(HashingEncoder):
+    """
+    HashingEncoder remembering how many texts it encoded.
+    """
+    
+    def __init__(self, dimension=64):
+        super().__init__(dimension=dimension)
+        self.encoded = 0
+    
+    def encode(self, texts):
+        self.encoded += len(texts)
+        return super().encode(texts)
+
+
+def test_embedding_cache_round_trip(tmp_path):
+    encoder = CountingEncoder()
+    texts = [f"question {number}" for number in range(40)]
+    cache = EmbeddingCache(str(tmp_path), encoder)
+    for start in range(0, len(texts), 4):
+        cache.encode(texts[start:start + 4])
+        cache.flush()
+    reopened = EmbeddingCache(str(tmp_path), encoder)
+    np.testing.assert_allclose(reopened.encode(texts), HashingEncoder(dimension=64).encode(texts))
+    assert reopened.misses == 0 and encoder.encoded == len(texts)
+
+
+def test_engine_only_encodes_new_questions(tmp_path):
+    texts = [f"question {number}" for number in range(20)]
+    EmbeddingEngine(CountingEncoder(), cache_dir=str(tmp_path)).build(texts)
+    
+    encoder = CountingEncoder()
+    engine = EmbeddingEngine(encoder, cache_dir=str(tmp_path))
+    engine.build(texts + ["a new question"])
+    engine.add("another new question")
+    assert encoder.encoded == 2
+    assert engine.search("another new question", 1)[0][0] == len(texts) + 1
+
+
+def test_encoders_do_not_share_cached_vectors(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), CountingEncoder(dimension=64))
+    cache.encode(["question"])
+    cache.flush()
+    encoder = CountingEncoder(dimension=32)
+    assert EmbeddingCache(str(tmp_path), encoder).encode(["question"]).shape == (1, 32)
+    assert encoder.encoded == 1
+
+
+def test_concurrent_writers_keep_each_others_vectors(tmp_path):
+    encoder = CountingEncoder()
+    first = EmbeddingCache(str(tmp_path), encoder)
+    second = EmbeddingCache(str(tmp_path), encoder)
+    first.encode(["first question"])
+    second.encode(["second question"])
+    first.flush()
+    # The second writer merges the manifest the first one replaced in the meantime
+    second.flush()
+    reopened = EmbeddingCache(str(tmp_path), encoder)
+    reopened.encode(["first question", "second question"])
+    assert reopened.misses == 0
+
+
+def test_flushes_only_merge_small_segments(tmp_path):
+    encoder = CountingEncoder()
+    cache = EmbeddingCache(str(tmp_path), encoder)
+    write_segment = cache._write_segment
+    written = []
+    cache._write_segment = lambda vectors: written.append(len(vectors)) or write_segment(vectors)
+    texts = [f"question {number}" for number in range(500)]
+    for text in texts:
+        cache.encode([text])
+        cache.flush()
+        sizes = [len(segment) for segment in cache._segments]
+        # Every segment is much larger than the one written after it
+        assert all(sizes[position] > EmbeddingCache.MERGE_RATIO * sizes[position + 1]
+                   for position in range(len(sizes) - 1))
+    # Merging everything every few flushes would write about 30 rows per row
+    assert sum(written) < 8 * len(texts)
+    assert sorted(path.name for path in tmp_path.glob("*.npy")) == sorted(cache._segment_names)
+    np.testing.assert_allclose(EmbeddingCache(str(tmp_path), encoder).encode(texts),
+                               HashingEncoder(dimension=64).encode(texts))
+
+
+def test_engine_writes_added_questions_in_batches(tmp_path):
+    texts = [f"question {number}" for number in range(20)]
+    engine = EmbeddingEngine(CountingEncoder(), cache_dir=str(tmp_path))
+    engine.build(texts)
+    for number in range(EmbeddingEngine.FLUSH_BATCH - 1):
+        engine.add(f"added question {number}")
+    assert engine.cache.pending == EmbeddingEngine.FLUSH_BATCH - 1
+    engine.add("one more question")
+    assert engine.cache.pending == 0
+    
+    engine.add("a last question")
+    engine.flush()
+    encoder = CountingEncoder()
+    EmbeddingEngine(encoder, cache_dir=str(tmp_path)).build(engine._texts)
+    assert encoder.encoded == 0
@@ -0,0 +1,267 @@
+"""
+Check the retrieval engines against exhaustive reference implementations.
+"""
+
+import json
+import math
+import os
+import random
+import re
+
+import pytest
+
+import main
+from engines import BM25Engine, EmbeddingEngine, HybridEngine, NGramEngine, TfidfEngine, create_engine
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "komodo_qa_data.json")
+
+
+@pytest.fixture(scope="module")
+def qa_data():
+    with open(DATA_PATH, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+
+@pytest.fixture(scope="module")
+def queries(qa_data):
+    rng = random.Random(0)
+    words = ' '.join(qa_pair["question"] for qa_pair in qa_data).split() + ["price?", "kids", "dragn", "xyz"]
+    generated = [' '.join(rng.choice(words) for _ in range(rng.randint(1, 9))) for _ in range(150)]
+    return [qa_pair["question"] for qa_pair in qa_data] + generated + ["", "???"]
+
+
+def normalize(text):
+    return ' '.join(re.sub(r'[^\w\s]', '', text.lower()).split())
+
+
+def exhaustive_bm25(texts, query, k1=1.2, b=0.75):
+    documents = [text.split() for text in texts]
+    average_length = max(sum(len(words) for words in documents) / len(documents), 1e-9)
+    document_frequencies = {}
+    for words in documents:
+        for term in set(words):
+            document_frequencies[term] = document_frequencies.get(term, 0) + 1
+    
+    def raw_score(query_words, words):
+        score = 0.0
+        for term in set(query_words):
+            frequency = words.count(term)
+            if frequency:
+                document_frequency = document_frequencies.get(term, 0)
+                idf = math.log(1.0 + (len(documents) - document_frequency + 0.5) / (document_frequency + 0.5))
+                norm = k1 * (1.0 - b + b * len(words) / average_length)
+                score += idf * frequency * (k1 + 1.0) / (frequency + norm)
+        return score
+    
+    query_words = query.split()
+    scores = []
+    for words in documents:
+        score = raw_score(query_words, words)
+        # Normalized by what the query and the document each score against themselves
+        scores.append(min(score / math.sqrt(raw_score(query_words, query_words) * raw_score(words, words)), 1.0)
+                      if score else 0.0)
+    return scores
+
+
+def check_bm25(texts, queries):
+    engine = BM25Engine()
+    engine.build(texts)
+    for query in queries:
+        processed = normalize(query)
+        expected = exhaustive_bm25(texts, processed)
+        positive = sorted((score for score in expected if score > 0), reverse=True)
+        for k in (1, 5, 20):
+            results = engine.search(processed, k)
+            assert [score for _, score in results] == pytest.approx(positive[:k], abs=1e-9)
+            for index, score in results:
+                assert score == pytest.approx(expected[index], abs=1e-9)
+        assert engine.search(processed, 0) == []
+
+
+def test_bm25_matches_exhaustive_scoring(qa_data, queries):
+    check_bm25([normalize(qa_pair["question"]) for qa_pair in qa_data], queries)
+
+
+def test_bm25_maxscore_pruning_matches_exhaustive_scoring(qa_data, queries):
+    rng = random.Random(1)
+    texts = [normalize(qa_pair["question"]) for qa_pair in qa_data]
+    vocabulary = ' '.join(texts).split()
+    # A larger corpus with skewed term frequencies so pruning actually kicks in
+    texts += [' '.join(rng.choice(vocabulary) for _ in range(rng.randint(2, 12))) for _ in range(400)]
+    check_bm25(texts, queries)
+
+
+def test_bm25_engine_answers_through_the_chatbot(qa_data):
+    chatbot = main.KomodoTourChatbot(list(qa_data), similarity_threshold=0.6, engine="bm25")
+    question = "Can I interact directly with the Komodo dragons?"
+    match, answer, score = chatbot.find_best_match("interact directly with komodo dragons")
+    assert (match, answer) == (question, qa_data[[q["question"] for q in qa_data].index(question)]["answer"])
+    assert score >= 0.6
+    assert chatbot.find_best_match("xyz") == (None, None, 0)
+    assert chatbot.find_similar_questions("xyz") == []
+    
+    chatbot.add_qa_pair("How much is a boat ticket?", "It depends on the boat.")
+    assert chatbot.find_best_match("boat ticket how much")[1] == "It depends on the boat."
+
+
+def test_bm25_scores_penalize_words_missing_from_either_side(qa_data):
+    chatbot = main.KomodoTourChatbot(list(qa_data), similarity_threshold=0.6, engine="bm25")
+    for query in ("the", "is", "can i", "komodo", "ticket"):
+        match, answer, score = chatbot.find_best_match(query)
+        assert match is None and score < 0.6
+    # Only a stored question identical to the query scores 1.0
+    engine = chatbot.engine
+    question = chatbot.preprocess_text("Can I interact directly with the Komodo dragons?")
+    assert engine.search(question, 1)[0][1] == pytest.approx(1.0)
+    assert engine.search(question + " today", 1)[0][1] < 1.0
+
+
+def check_against_pairwise(engine, texts, queries, similarity):
+    for query in queries:
+        processed = normalize(query)
+        expected = [similarity(processed, text) for text in texts]
+        positive = sorted((score for score in expected if score > 0), reverse=True)
+        results = engine.search(processed, 5)
+        assert [score for _, score in results] == pytest.approx(positive[:5], abs=1e-5)
+        for index, score in results:
+            assert score == pytest.approx(expected[index], abs=1e-5)
+
+
+def test_ngram_scores_match_pairwise_cosine(qa_data, queries):
+    pytest.importorskip("numpy")
+    texts = [normalize(qa_pair["question"]) for qa_pair in qa_data]
+    engine = NGramEngine()
+    engine.build(texts[:10])
+    engine.search("komodo", 1)
+    # Rows added after a search are merged into the arrays on the next one
+    for text in texts[10:]:
+        engine.add(text)
+    check_against_pairwise(engine, texts, queries, engine.similarity)
+
+
+def test_ngram_engine_tolerates_typos(qa_data):
+    pytest.importorskip("numpy")
+    chatbot = main.KomodoTourChatbot(list(qa_data), similarity_threshold=0.6, engine="ngram")
+    question = "Can I interact directly with the Komodo dragons?"
+    assert chatbot.find_similar_questions("komodo dragn", 1)[0][0] == question
+    assert chatbot.find_best_match("Can I interact with komodo dragns")[0] == question
+
+
+def tfidf_cosine(engine, query, text):
+    query_weights = {feature: count * engine.idf(feature) for feature, count in engine.features(query).items()}
+    text_weights = {feature: count * engine.idf(feature) for feature, count in engine.features(text).items()}
+    dot = sum(weight * text_weights.get(feature, 0.0) for feature, weight in query_weights.items())
+    norms = math.sqrt(sum(w * w for w in query_weights.values())) * math.sqrt(sum(w * w for w in text_weights.values()))
+    return dot / norms if norms else 0.0
+
+
+@pytest.mark.parametrize("char_ngrams", [None, (2, 4)])
+def test_tfidf_scores_match_pairwise_cosine(qa_data, queries, char_ngrams):
+    pytest.importorskip("numpy")
+    texts = [normalize(qa_pair["question"]) for qa_pair in qa_data]
+    engine = TfidfEngine(char_ngrams=char_ngrams)
+    engine.build(texts[:10])
+    engine.search("komodo", 1)
+    # Adding questions changes the IDF weights of the rows built before
+    for text in texts[10:]:
+        engine.add(text)
+    check_against_pairwise(engine, texts, queries, lambda query, text: tfidf_cosine(engine, query, text))
+
+
+def test_tfidf_engine_answers_through_the_chatbot(qa_data):
+    pytest.importorskip("numpy")
+    chatbot = main.KomodoTourChatbot(list(qa_data), similarity_threshold=0.6, engine="tfidf")
+    match = chatbot.find_best_match("can i interact directly with komodo dragons")
+    assert match[0] == "Can I interact directly with the Komodo dragons?" and match[2] >= 0.6
+    chatbot.add_qa_pair("How much is a boat ticket?", "It depends on the boat.")
+    assert chatbot.find_best_match("how much is the boat ticket")[1] == "It depends on the boat."
+
+
+def test_embedding_scores_match_pairwise_dot_products(qa_data, queries):
+    np = pytest.importorskip("numpy")
+    texts = [normalize(qa_pair["question"]) for qa_pair in qa_data]
+    engine = EmbeddingEngine()
+    engine.build(texts[:1])
+    # The matrix grows as questions are added one by one
+    for text in texts[1:]:
+        engine.add(text)
+    vectors = engine.encoder.encode(texts)
+    np.testing.assert_allclose(np.linalg.norm(vectors, axis=1), 1.0, rtol=1e-5)
+    check_against_pairwise(engine, texts, queries,
+                           lambda query, text: float(engine.encoder.encode([query])[0] @ vectors[texts.index(text)]))
+
+
+def test_embedding_engine_answers_added_questions(qa_data):
+    pytest.importorskip("numpy")
+    chatbot = main.KomodoTourChatbot(list(qa_data), similarity_threshold=0.6, engine="embedding")
+    assert chatbot.find_best_match("can i interact directly with komodo dragons")[0] == (
+        "Can I interact directly with the Komodo dragons?"
+    )
+    chatbot.add_qa_pair("How much is a boat ticket?", "It depends on the boat.")
+    assert chatbot.find_best_match("how much is the boat ticket")[1] == "It depends on the boat."
+
+
+class FixedEngine:
+    """
+    Engine returning a fixed ranking, recording how many results were requested.
+    """
+    
+    def __init__(self, ranking):
+        self.ranking = ranking
+        self.requested = []
+    
+    def build(self, texts):
+        pass
+    
+    def add(self, text):
+        return len(self.ranking)
+    
+    def search(self, text, k):
+        self.requested.append(k)
+        return [(index, 1.0) for index in self.ranking[:k]]
+
+
+def reciprocal_rank_fusion(rankings, k_rrf):
+    fused = {}
+    for ranking in rankings:
+        for rank, index in enumerate(ranking, 1):
+            fused[index] = fused.get(index, 0.0) + 1.0 / (k_rrf + rank)
+    best_possible = len(rankings) / (k_rrf + 1.0)
+    return sorted(((index, score / best_possible) for index, score in fused.items()), key=lambda entry: -entry[1])
+
+
+def test_hybrid_engine_fuses_reciprocal_ranks():
+    first = FixedEngine([0, 1, 2, 3, 4, 5])
+    second = FixedEngine([2, 0, 5, 1])
+    engine = HybridEngine([first, second], depth=3, k_rrf=60)
+    # Every engine contributes its own top max(depth, k) questions only
+    for k, depth in ((2, 3), (10, 10)):
+        expected = reciprocal_rank_fusion([first.ranking[:depth], second.ranking[:depth]], 60)[:k]
+        results = engine.search("query", k)
+        assert [index for index, _ in results] == [index for index, _ in expected]
+        assert [score for _, score in results] == pytest.approx([score for _, score in expected])
+        assert first.requested[-1] == second.requested[-1] == depth
+    assert engine.search("query", 1) == [(0, pytest.approx((1 / 61 + 1 / 62) / (2 / 61)))]
+
+
+def test_hybrid_engine_only_ranks_suggestions(qa_data, queries):
+    pytest.importorskip("numpy")
+    chatbot = main.KomodoTourChatbot(list(qa_data), similarity_threshold=0.6, suggestion_engine="hybrid")
+    plain = main.KomodoTourChatbot(list(qa_data), similarity_threshold=0.6)
+    for query in queries:
+        assert chatbot.find_best_match(query) == plain.find_best_match(query)
+        ranked = chatbot.suggestion_engine.search(chatbot.preprocess_text(query), 5)
+        assert chatbot.find_similar_questions(query) == [(qa_data[index]["question"], score) for index, score in ranked]
+
+
+def test_create_engine_rejects_unknown_names():
+    with pytest.raises(ValueError):
+        create_engine("nonexistent")
+
+
+def test_hybrid_engine_cannot_pick_the_best_match(qa_data):
+    with pytest.raises(ValueError):
+        create_engine("hybrid")
+    assert isinstance(create_engine("hybrid", suggestions=True, engines=[FixedEngine([0])]), HybridEngine)
+    with pytest.raises(ValueError):
+        main.KomodoTourChatbot(list(qa_data), engine=HybridEngine([FixedEngine([0])]))
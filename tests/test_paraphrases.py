@@ -0,0 +1,132 @@
+"""
+Check the paraphrase table and the chatbot answering from it.
+"""
+
+import json
+import os
+
+import pytest
+
+import main
+from paraphrases import ParaphraseTable, build_table_file
+from synonyms import SynonymCanonicalizer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+QA_PATH = os.path.join(ROOT, "komodo_qa_data.json")
+SYNONYMS_PATH = os.path.join(ROOT, "synonyms.json")
+
+
+@pytest.fixture(scope="module")
+def qa_data():
+    with open(QA_PATH, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+
+def position_of(qa_data, question):
+    return [qa_pair["question"] for qa_pair in qa_data].index(question)
+
+
+def test_table_maps_paraphrases_to_their_question(qa_data):
+    table = ParaphraseTable(SynonymCanonicalizer.from_file(SYNONYMS_PATH))
+    table.build(qa_pair["question"] for qa_pair in qa_data)
+    expected = position_of(qa_data, "Is there a special price for children?")
+    assert table.lookup("Is there a special cost for kids?") == expected
+    assert table.lookup("is there a special price for children") == expected
+    assert table.lookup("Can I bring my pet iguana?") is None
+
+
+def test_duplicate_canonical_forms_keep_the_first_question():
+    table = ParaphraseTable(SynonymCanonicalizer({"cost": ["price"]}))
+    table.build(["What is the price?", "What is the cost?", "Where do we meet?"])
+    assert len(table) == 2
+    assert table.lookup("what is the cost") == 0
+    assert table.lookup("Where do we meet") == 2
+
+
+def test_saved_table_loads_with_the_same_synonyms_only(qa_data, tmp_path):
+    path = str(tmp_path / "paraphrases.json")
+    table = build_table_file(QA_PATH, SYNONYMS_PATH, path)
+    
+    loaded = ParaphraseTable.load(path, SynonymCanonicalizer.from_file(SYNONYMS_PATH))
+    assert len(loaded) == len(table)
+    assert loaded.size == len(qa_data)
+    assert loaded.lookup("Is there a special cost for kids?") == table.lookup("Is there a special cost for kids?")
+    
+    # Canonical forms built with other synonyms would be stale, so they are dropped
+    stale = ParaphraseTable.load(path, SynonymCanonicalizer({"cost": ["price"]}))
+    assert len(stale) == 0 and stale.size == 0
+    assert len(ParaphraseTable.load(path)) == 0
+
+
+def test_chatbot_answers_paraphrases_without_scoring(qa_data):
+    chatbot = main.KomodoTourChatbot(list(qa_data), similarity_threshold=0.6, synonyms=SYNONYMS_PATH,
+                                     paraphrase_table=True)
+    match, answer, score = chatbot.find_best_match("Is there a special cost for kids?")
+    assert (match, score) == ("Is there a special price for children?", 1.0)
+    assert chatbot.stats["paraphrase_hits"] == 1
+    
+    chatbot.add_qa_pair("Can I rent snorkel gear?", "Yes, at the harbour.")
+    assert chatbot.paraphrase_table.size == len(chatbot.qa_data)
+    assert chatbot.find_best_match("can i rent snorkel gear")[:2] == ("Can I rent snorkel gear?",
+                                                                     "Yes, at the harbour.")
+    assert chatbot.stats["paraphrase_hits"] == 2
+
+
+def test_chatbot_rebuilds_a_table_covering_more_questions(qa_data, tmp_path):
+    path = str(tmp_path / "paraphrases.json")
+    build_table_file(QA_PATH, SYNONYMS_PATH, path)
+    chatbot = main.KomodoTourChatbot(list(qa_data[:10]), synonyms=SYNONYMS_PATH, paraphrase_table=path)
+    assert chatbot.paraphrase_table.size == 10
+    assert chatbot.paraphrase_table.lookup(qa_data[20]["question"]) is None
+
+
+def test_table_covers_only_the_questions_it_was_built_from(qa_data):
+    questions = [qa_pair["question"] for qa_pair in qa_data]
+    table = ParaphraseTable()
+    table.build(questions[:10])
+    assert table.covers(questions[:10]) and table.covers(questions)
+    assert not table.covers(questions[:9])
+    assert not table.covers(questions[1:11])
+
+
+def test_chatbot_rebuilds_a_table_built_from_other_questions(qa_data, tmp_path):
+    path = str(tmp_path / "paraphrases.json")
+    build_table_file(QA_PATH, SYNONYMS_PATH, path)
+    reordered = list(reversed(qa_data))
+    chatbot = main.KomodoTourChatbot(reordered, similarity_threshold=0.6, synonyms=SYNONYMS_PATH,
+                                     paraphrase_table=path)
+    assert chatbot.paraphrase_table.covers([qa_pair["question"] for qa_pair in reordered])
+    match, answer, score = chatbot.find_best_match("Is there a special cost for kids?")
+    assert (match, score) == ("Is there a special price for children?", 1.0)
+    assert answer == reordered[position_of(reordered, match)]["answer"]
+
+
+@pytest.mark.parametrize("content", ['{"synonyms": "', '[]', '{"synonyms": "x"}', '{"questions": ["zz"]}'])
+def test_unreadable_table_files_load_as_empty_tables(qa_data, tmp_path, content):
+    path = str(tmp_path / "paraphrases.json")
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(content)
+    assert len(ParaphraseTable.load(path)) == 0
+    # The chatbot rebuilds the table instead of failing to start
+    chatbot = main.KomodoTourChatbot(list(qa_data), similarity_threshold=0.6, paraphrase_table=path)
+    assert chatbot.paraphrase_table.size == len(qa_data)
+
+
+def test_table_with_out_of_range_answers_is_ignored(tmp_path):
+    path = str(tmp_path / "paraphrases.json")
+    table = ParaphraseTable()
+    table.build(["Where do we meet?"])
+    table._answers = {key: 5 for key in table._answers}
+    table.save(path)
+    assert len(ParaphraseTable.load(path)) == 0
+
+
+def test_saving_replaces_the_table_file_atomically(tmp_path):
+    path = str(tmp_path / "paraphrases.json")
+    table = ParaphraseTable()
+    table.build(["Where do we meet?"])
+    table.save(path)
+    table.add("When do we leave?")
+    table.save(path)
+    assert os.listdir(str(tmp_path)) == ["paraphrases.json"]
+    assert ParaphraseTable.load(path).size == 2
@@ -0,0 +1,133 @@
+"""
+Check the LRU query cache and its invalidation by the chatbot.
+"""
+
+import json
+import os
+
+import pytest
+
+import main
+from query_cache import KEY_POLICIES, QueryCache, estimate_size
+from synonyms import SynonymCanonicalizer
+from text_processing import STOPWORDS
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+QA_PATH = os.path.join(ROOT, "komodo_qa_data.json")
+SYNONYMS_PATH = os.path.join(ROOT, "synonyms.json")
+
+
+@pytest.fixture(scope="module")
+def qa_data():
+    with open(QA_PATH, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+
+def test_least_recently_used_entries_are_evicted_first():
+    cache = QueryCache(max_entries=2)
+    cache.put("a", 1, 0)
+    cache.put("b", 2, 0)
+    assert cache.get("a", 0) == 1
+    cache.put("c", 3, 0)
+    # "b" was used least recently, since the lookup of "a" refreshed it
+    assert cache.get("b", 0) is None
+    assert (cache.get("a", 0), cache.get("c", 0)) == (1, 3)
+    assert (len(cache), cache.evictions) == (2, 1)
+    assert (cache.hits, cache.misses) == (3, 1)
+    assert cache.hit_rate() == 0.75
+
+
+def test_entries_are_evicted_beyond_the_byte_bound():
+    entry_size = estimate_size("key0") + estimate_size(("answer", 0.5))
+    cache = QueryCache(max_entries=100, max_bytes=3 * entry_size)
+    for number in range(5):
+        cache.put(f"key{number}", ("answer", 0.5), 0)
+        assert cache.bytes <= cache.max_bytes
+    assert len(cache) == 3 and cache.evictions == 2
+    assert cache.get("key1", 0) is None and cache.get("key4", 0) == ("answer", 0.5)
+    assert cache.bytes == sum(estimate_size(key) + estimate_size(("answer", 0.5)) for key in cache._entries)
+    
+    # A result larger than the whole budget is not cached at all
+    cache.put("huge", "x" * cache.max_bytes, 0)
+    assert cache.get("huge", 0) is None and len(cache) == 3
+
+
+def test_a_new_version_drops_every_entry():
+    cache = QueryCache()
+    cache.put("a", 1, 0)
+    assert cache.get("a", 1) is None
+    assert len(cache) == 0 and cache.bytes == 0
+
+
+def test_chatbot_answers_repeated_questions_from_the_cache(qa_data):
+    chatbot = main.KomodoTourChatbot(list(qa_data), similarity_threshold=0.6, query_cache=True)
+    reference = main.KomodoTourChatbot(list(qa_data), similarity_threshold=0.6)
+    for query in ["Can I book a ticket for the same day?", "what about kids", "Can I book a ticket for the same day"]:
+        assert chatbot.rank_questions(query) == reference.rank_questions(query)
+    assert (chatbot.query_cache.hits, chatbot.query_cache.misses) == (1, 2)
+    # Cached suggestion lists are copies the caller may modify
+    chatbot.rank_questions("what about kids")[3].clear()
+    assert chatbot.rank_questions("what about kids") == reference.rank_questions("what about kids")
+
+
+def test_adding_or_reloading_questions_invalidates_the_cache(qa_data, tmp_path):
+    chatbot = main.KomodoTourChatbot(list(qa_data), similarity_threshold=0.6, query_cache=True)
+    query = "Can I rent snorkel gear?"
+    assert chatbot.find_best_match(query)[0] is None
+    
+    chatbot.add_qa_pair(query, "Yes, at the harbour.")
+    assert chatbot.find_best_match(query)[:3] == (query, "Yes, at the harbour.", 1.0)
+    
+    path = str(tmp_path / "qa.json")
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(qa_data, file)
+    chatbot.reload_qa_data(path)
+    assert chatbot.find_best_match(query)[0] is None
+    assert chatbot.query_cache.hits == 0
+
+
+def test_key_policies_merge_increasingly_many_questions():
+    canonicalizer = SynonymCanonicalizer.from_file(SYNONYMS_PATH)
+    question = "is there a special cost for kids"
+    keys = {name: policy.key(question, canonicalizer) for name, policy in KEY_POLICIES.items()}
+    assert keys["exact"] == question
+    assert keys["synonyms"] == canonicalizer.canonicalize(question)
+    assert keys["bag_of_words"] == "cost kids special"
+    assert keys["canonical"] == ' '.join(sorted(token for token in keys["synonyms"].split()
+                                                if token not in STOPWORDS))
+    assert KEY_POLICIES["canonical"].key("special price for children", canonicalizer) == keys["canonical"]
+    # A question made of stopwords only keeps them rather than sharing an empty key
+    assert KEY_POLICIES["bag_of_words"].key("what is it") == "is it what"
+    with pytest.raises(ValueError):
+        QueryCache(key_policy="fuzzy")
+
+
+def test_shadow_policies_measure_their_hit_rates(qa_data):
+    cache = QueryCache(key_policy="exact", shadow_policies=["synonyms", "canonical"])
+    chatbot = main.KomodoTourChatbot(list(qa_data), similarity_threshold=0.6, synonyms=SYNONYMS_PATH,
+                                     query_cache=cache)
+    for query in ["special price for children", "children special price",
+                  "special cost for kids", "special price for children?"]:
+        chatbot.find_best_match(query)
+    # Questions are canonicalized by preprocess_text already, so only word order matters
+    assert cache.policy_hit_rates() == {"exact": 0.5, "synonyms": 0.5, "canonical": 0.75}
+
+
+def test_canonical_keys_share_results_between_equivalent_questions(qa_data):
+    chatbot = main.KomodoTourChatbot(list(qa_data), similarity_threshold=0.6, synonyms=SYNONYMS_PATH,
+                                     query_cache=QueryCache(key_policy="canonical"))
+    first = chatbot.find_best_match("special price for children")
+    assert chatbot.find_best_match("children: special price?") == first
+    assert (chatbot.query_cache.hits, chatbot.query_cache.misses) == (1, 1)
+
+
+def test_exact_and_paraphrase_matches_bypass_lossy_keys(qa_data):
+    question = "Is there a special price for children?"
+    chatbot = main.KomodoTourChatbot(list(qa_data), similarity_threshold=0.6, synonyms=SYNONYMS_PATH,
+                                     paraphrase_table=True, query_cache=QueryCache(key_policy="canonical"))
+    # Shares its canonical key with the stored question, without being an exact match
+    loose = chatbot.find_best_match("children special price")
+    assert loose[2] < 1.0
+    assert chatbot.find_best_match(question)[::2] == (question, 1.0)
+    assert chatbot.find_best_match("Is there a special cost for kids?")[::2] == (question, 1.0)
+    assert (chatbot.query_cache.hits, chatbot.query_cache.misses) == (0, 1)
@@ -0,0 +1,176 @@
+"""
+Check the chatbot's SequenceMatcher search paths against a plain scan of every question.
+"""
+
+import functools
+import json
+import os
+import random
+import re
+from difflib import SequenceMatcher
+
+import pytest
+
+import main
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "komodo_qa_data.json")
+
+
+@pytest.fixture(scope="module")
+def qa_data():
+    with open(DATA_PATH, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+
+@pytest.fixture(scope="module")
+def queries(qa_data):
+    rng = random.Random(0)
+    words = ' '.join(qa_pair["question"] for qa_pair in qa_data).split() + ["price?", "kids", "dragn", "xyz"]
+    generated = [' '.join(rng.choice(words) for _ in range(rng.randint(1, 9))) for _ in range(150)]
+    truncated = [question[:rng.randint(1, len(question))] for question in (q["question"] for q in qa_data)]
+    return [qa_pair["question"] for qa_pair in qa_data] + generated + truncated + ["", "???"]
+
+
+def normalize(text):
+    return ' '.join(re.sub(r'[^\w\s]', '', text.lower()).split())
+
+
+@functools.lru_cache(maxsize=None)
+def ranked_questions(questions, query):
+    processed = normalize(query)
+    scores = [(question, SequenceMatcher(None, processed, normalize(question)).ratio()) for question in questions]
+    # Stable sort keeps the dataset order on ties
+    return sorted(scores, key=lambda entry: -entry[1])
+
+
+def plain_scan(qa_data, query, n):
+    return ranked_questions(tuple(qa_pair["question"] for qa_pair in qa_data), query)[:n]
+
+
+def expected_best_match(qa_data, query, threshold):
+    ranked = plain_scan(qa_data, query, 1)
+    best_score = ranked[0][1] if ranked else 0
+    if best_score > 0 and best_score >= threshold:
+        question = ranked[0][0]
+        answer = next(qa_pair["answer"] for qa_pair in qa_data if qa_pair["question"] == question)
+        return question, answer, best_score
+    return None, None, best_score
+
+
+def check_against_plain_scan(chatbot, queries):
+    for query in queries:
+        for n in (1, 5, 30):
+            assert chatbot.find_similar_questions(query, n) == plain_scan(chatbot.qa_data, query, n)
+        expected = expected_best_match(chatbot.qa_data, query, chatbot.similarity_threshold)
+        assert chatbot.find_best_match(query) == expected
+        assert chatbot.rank_questions(query, 5) == expected + (plain_scan(chatbot.qa_data, query, 5),)
+
+
+@pytest.fixture(params=[True, False], ids=["histogram", "length_buckets"])
+def use_numpy(request, monkeypatch):
+    if request.param:
+        pytest.importorskip("numpy")
+    else:
+        # Without numpy the length buckets replace the histogram bounds
+        monkeypatch.setattr(main, "np", None)
+    return request.param
+
+
+@pytest.mark.parametrize("threshold", [0.3, 0.6, 0.75])
+def test_search_matches_plain_scan(qa_data, queries, threshold, use_numpy):
+    chatbot = main.KomodoTourChatbot(list(qa_data), similarity_threshold=threshold)
+    check_against_plain_scan(chatbot, queries)
+
+
+def test_added_questions_are_searched(qa_data, queries, use_numpy):
+    chatbot = main.KomodoTourChatbot(list(qa_data), similarity_threshold=0.6)
+    chatbot.add_qa_pair("How much is a boat ticket?", "It depends on the boat.")
+    check_against_plain_scan(chatbot, queries[:60] + ["boat ticket price", "How much is a boat ticket"])
+
+
+def test_top_k_selector_matches_stable_sort():
+    rng = random.Random(2)
+    scores = [rng.choice([0.1, 0.5, 0.5, 0.9]) for _ in range(200)]
+    expected = sorted(enumerate(scores), key=lambda entry: -entry[1])
+    for k in (1, 7, 300):
+        top = main.TopKSelector(k)
+        for index, score in enumerate(scores):
+            top.push(score, index)
+        assert top.items() == expected[:k]
+        assert top.cutoff == (expected[k - 1][1] if k <= len(scores) else float('-inf'))
+    
+    # A selector keeping nothing rejects every entry
+    top = main.TopKSelector(0)
+    assert not top.push(1.0, 0)
+    assert top.items() == [] and top.cutoff == float('inf')
+
+
+def test_cascaded_ratio_only_drops_scores_below_min_score(queries):
+    for first, second in zip(queries, reversed(queries)):
+        ratio = SequenceMatcher(None, first, second).ratio()
+        assert main.cascaded_ratio(SequenceMatcher(None, first, second)) == ratio
+        for min_score in (0.0, 0.3, 0.6, 0.9):
+            cascaded = main.cascaded_ratio(SequenceMatcher(None, first, second), min_score)
+            if ratio >= min_score:
+                assert cascaded == ratio
+            else:
+                assert cascaded in (0.0, ratio)
+
+
+def test_length_bound_skips_questions_that_cannot_qualify(qa_data, monkeypatch):
+    monkeypatch.setattr(main, "np", None)
+    chatbot = main.KomodoTourChatbot(list(qa_data), similarity_threshold=0.6)
+    chatbot.find_similar_questions("Can I book a ticket for the same day", 1)
+    assert chatbot.stats["skipped_by_length"] > 0
+    assert chatbot.stats["entries_visited"] + chatbot.stats["skipped_by_length"] == len(qa_data)
+
+
+def test_histogram_bound_skips_questions_that_cannot_qualify(qa_data):
+    pytest.importorskip("numpy")
+    chatbot = main.KomodoTourChatbot(list(qa_data), similarity_threshold=0.6)
+    chatbot.find_similar_questions("Can I book a ticket for the same day", 1)
+    assert chatbot.stats["skipped_by_histogram"] > 0
+    assert chatbot.stats["entries_visited"] + chatbot.stats["skipped_by_histogram"] == len(qa_data)
+
+
+def test_exact_normalized_match_skips_scoring(qa_data):
+    chatbot = main.KomodoTourChatbot(list(qa_data) + [dict(qa_data[2], answer="Duplicate")], similarity_threshold=0.6)
+    question = qa_data[2]["question"]
+    assert chatbot.find_best_match("  " + question.upper().rstrip("?") + "!!") == (
+        question, qa_data[2]["answer"], 1.0
+    )
+    assert chatbot.stats["exact_hits"] == 1 and chatbot.stats["entries_visited"] == 0
+    assert chatbot.rank_questions(question, suggest_on_match=False) == (question, qa_data[2]["answer"], 1.0, [])
+    assert chatbot.stats["exact_hits"] == 2
+
+
+def test_suggestions_on_a_miss_do_not_depend_on_suggest_on_match(qa_data, queries):
+    chatbot = main.KomodoTourChatbot(list(qa_data), similarity_threshold=0.6)
+    for query in queries:
+        match, answer, score, similar = chatbot.rank_questions(query, 5)
+        if match is None:
+            assert chatbot.rank_questions(query, 5, suggest_on_match=False) == (None, None, score, similar)
+        else:
+            assert chatbot.rank_questions(query, 5, suggest_on_match=False) == (match, answer, score, [])
+
+
+def prefiltered_scan(qa_data, query, n):
+    tokens = set(normalize(query).split()) - main.STOPWORDS
+    candidates = [qa_pair for qa_pair in qa_data if tokens & set(normalize(qa_pair["question"]).split())]
+    # Without any shared token every question is scored
+    return plain_scan(candidates or qa_data, query, n)
+
+
+def test_token_prefilter_only_scores_questions_sharing_a_word(qa_data, queries, use_numpy):
+    chatbot = main.KomodoTourChatbot(list(qa_data), similarity_threshold=0.6, token_prefilter=True)
+    for query in queries:
+        for n in (1, 5, 30):
+            assert chatbot.find_similar_questions(query, n) == prefiltered_scan(qa_data, query, n)
+    assert chatbot.stats["skipped_by_tokens"] > 0
+
+
+def test_token_prefilter_falls_back_to_every_question(qa_data, use_numpy):
+    chatbot = main.KomodoTourChatbot(list(qa_data), similarity_threshold=0.6, token_prefilter=True)
+    for query in ("xyz", "can i do it", ""):
+        assert chatbot.find_similar_questions(query, 5) == plain_scan(qa_data, query, 5)
+    assert chatbot.stats["skipped_by_tokens"] == 0
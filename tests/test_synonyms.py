@@ -0,0 +1,145 @@
+"""
+Check synonym canonicalization against a brute-force rewriter.
+"""
+
+import json
+import os
+import random
+import re
+
+import pytest
+
+import main
+from synonyms import SynonymCanonicalizer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SYNONYMS_PATH = os.path.join(ROOT, "synonyms.json")
+
+
+@pytest.fixture(scope="module")
+def synonyms():
+    with open(SYNONYMS_PATH, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+
+@pytest.fixture(scope="module")
+def qa_data():
+    with open(os.path.join(ROOT, "komodo_qa_data.json"), 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+
+def normalize(text):
+    return ' '.join(re.sub(r'[^\w\s]', '', text.lower()).split())
+
+
+def replacement_table(synonyms):
+    replacements = {}
+    for canonical, variants in synonyms.items():
+        for phrase in [canonical] + variants:
+            # The first canonical phrase listing a variant wins
+            replacements.setdefault(normalize(phrase), normalize(canonical))
+    # A canonical phrase may itself contain a variant, so targets are rewritten as well
+    return {phrase: brute_force_rewrite(replacements, target) for phrase, target in replacements.items()}
+
+
+def brute_force_rewrite(replacements, text):
+    for _ in range(8):
+        rewritten = rewrite_once(replacements, text)
+        if rewritten == text:
+            break
+        text = rewritten
+    return text
+
+
+def rewrite_once(replacements, text):
+    words = text.split()
+    longest = max(len(phrase.split()) for phrase in replacements)
+    result = []
+    position = 0
+    while position < len(words):
+        for length in range(min(longest, len(words) - position), 0, -1):
+            phrase = ' '.join(words[position:position + length])
+            if phrase in replacements:
+                result.append(replacements[phrase])
+                position += length
+                break
+        else:
+            result.append(words[position])
+            position += 1
+    return ' '.join(result)
+
+
+def test_canonicalize_matches_brute_force_leftmost_longest(synonyms, qa_data):
+    canonicalizer = SynonymCanonicalizer(synonyms)
+    replacements = replacement_table(synonyms)
+    phrases = list(replacements) + ' '.join(qa_pair["question"] for qa_pair in qa_data).split()
+    rng = random.Random(0)
+    texts = [normalize(qa_pair["question"]) for qa_pair in qa_data]
+    texts += [normalize(' '.join(rng.choice(phrases) for _ in range(rng.randint(1, 8)))) for _ in range(500)]
+    for text in texts:
+        canonical = canonicalizer.canonicalize(text)
+        assert canonical == brute_force_rewrite(replacements, text)
+        assert canonicalizer.canonicalize(canonical) == canonical
+
+
+def test_longer_phrases_and_earlier_canonical_phrases_win(synonyms):
+    canonicalizer = SynonymCanonicalizer(synonyms)
+    # "same day booking" is a canonical phrase, so "same day" is not rewritten inside it
+    assert canonicalizer.canonicalize("is same day booking possible") == "is same day booking possible"
+    assert canonicalizer.canonicalize("can i book now") == "can i same day booking"
+    # "reserve" is listed under "book" before "Komodo National Park"
+    assert canonicalizer.canonicalize("reserve a tour") == "book a tour"
+    assert canonicalizer.canonicalize("meet komodo dragons today") == "interact with komodo dragons same day"
+    # Rewrites forming a new phrase are rewritten again
+    assert canonicalizer.canonicalize("reserve now") == "same day booking"
+
+
+def test_chatbot_matches_questions_through_synonyms(qa_data):
+    chatbot = main.KomodoTourChatbot(list(qa_data), similarity_threshold=0.6, synonyms=SYNONYMS_PATH)
+    question = "Is there a special price for children?"
+    match, answer, score = chatbot.find_best_match("Is there a special cost for kids?")
+    assert (match, score) == (question, 1.0)
+    assert chatbot.preprocess_text("Is there a special cost for kids?") == chatbot.preprocess_text(question)
+
+
+def test_variants_substitute_single_phrases_before_combining_them(synonyms):
+    canonicalizer = SynonymCanonicalizer(synonyms)
+    text = "is there a special price for children"
+    variants = canonicalizer.variants(text, 12)
+    # Single substitutions alternate between the matched phrases
+    assert variants[:4] == [
+        "is there a special cost for children",
+        "is there a special price for kids",
+        "is there a special fee for children",
+        "is there a special price for minors",
+    ]
+    assert variants[9] == "is there a special cost for kids"
+    assert len(set(variants)) == 12 and text not in variants
+    assert canonicalizer.variants(text, 0) == []
+    assert canonicalizer.variants("nothing to swap here", 5) == []
+
+
+@pytest.mark.parametrize("engine", [None, "bm25"])
+def test_synonym_variants_keep_one_suggestion_per_answer(synonyms, qa_data, engine):
+    canonicalizer = SynonymCanonicalizer(synonyms)
+    chatbot = main.KomodoTourChatbot(list(qa_data), similarity_threshold=0.6, engine=engine,
+                                     synonyms=synonyms, synonym_variants=20)
+    entries = []
+    for qa_pair in qa_data:
+        question = normalize(qa_pair["question"])
+        entries += [(qa_pair["question"], text) for text in [question] + canonicalizer.variants(question, 20)]
+    # A chatbot indexing every variant as a question of its own ranks all entries
+    reference = main.KomodoTourChatbot([{"question": text, "answer": ""} for _, text in entries],
+                                       similarity_threshold=0.6, engine=engine)
+    owner = {}
+    for question, text in entries:
+        owner.setdefault(text, question)
+    
+    for query in ("Is there a special cost for kids?", "komodo", "can i reserve a trip today", "xyz"):
+        # The best entry of every answer, in the order of the ranking of all entries
+        best = {}
+        for text, score in reference.find_similar_questions(query, len(entries)):
+            best.setdefault(owner[text], score)
+        expected = list(best.items())[:10]
+        assert chatbot.find_similar_questions(query, 10) == expected
+    assert chatbot.find_best_match("Is there a special cost for kids?")[2] == 1.0
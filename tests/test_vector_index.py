@@ -0,0 +1,260 @@
+"""
+Check the vector indexes against exact search.
+"""
+
+import json
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from vector_index import FlatIndex, HNSWIndex, Int8Index, IVFIndex, PQIndex, kmeans  # noqa: E402
+
+
+def unit_vectors(count, dimension=32, seed=0):
+    vectors = np.random.RandomState(seed).randn(count, dimension).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def exact_top_k(vectors, query, k):
+    scores = vectors @ query
+    order = sorted((index for index in range(len(scores)) if scores[index] > 0), key=lambda index: -scores[index])
+    return order[:k]
+
+
+@pytest.mark.parametrize("make_index", [
+    FlatIndex,
+    lambda: IVFIndex(nlist=8, nprobe=8),
+])
+def test_exhaustive_index_configurations_are_exact(make_index):
+    vectors = unit_vectors(400)
+    index = make_index()
+    for start in range(0, len(vectors), 50):
+        index.add(vectors[start:start + 50])
+    for query in unit_vectors(20, seed=1):
+        assert [node for node, _ in index.search(query, 10)] == exact_top_k(vectors, query, 10)
+
+
+@pytest.mark.parametrize("make_index", [
+    FlatIndex,
+    HNSWIndex,
+    lambda: IVFIndex(nlist=8),
+    Int8Index,
+    lambda: PQIndex(m=4, ks=16),
+])
+def test_searching_for_no_results_returns_none(make_index):
+    vectors = unit_vectors(300)
+    index = make_index()
+    index.add(vectors)
+    assert index.search(vectors[0], 0) == []
+
+
+def test_hnsw_recall():
+    vectors = unit_vectors(500)
+    index = HNSWIndex(ef_search=100)
+    index.add(vectors)
+    found = 0
+    queries = unit_vectors(50, seed=1)
+    for query in queries:
+        found += len(set(node for node, _ in index.search(query, 10)) & set(exact_top_k(vectors, query, 10)))
+    assert found / (10 * len(queries)) >= 0.95
+
+
+@pytest.mark.parametrize("make_index", [
+    FlatIndex,
+    HNSWIndex,
+    lambda: IVFIndex(nlist=8, nprobe=2),
+    lambda: IVFIndex(nlist=8, nprobe=2, min_train=1000),
+    Int8Index,
+    lambda: Int8Index(min_train=1000),
+    lambda: PQIndex(m=4, ks=16),
+    lambda: PQIndex(m=4, ks=16, min_train=1000),
+])
+def test_index_save_load_round_trip(make_index, tmp_path):
+    vectors = unit_vectors(300)
+    index = make_index()
+    index.add(vectors)
+    path = str(tmp_path / "index.npz")
+    index.save(path)
+    loaded = type(index).load(path)
+    assert loaded.size == index.size
+    np.testing.assert_allclose(loaded.vectors, index.vectors)
+    for query in unit_vectors(10, seed=1):
+        assert loaded.search(query, 5) == index.search(query, 5)
+    loaded.clear()
+    assert loaded.size == 0 and loaded.search(vectors[0], 5) == []
+
+
+def test_engine_keeps_a_loaded_index_holding_its_vectors(tmp_path):
+    from engines import EmbeddingEngine
+    
+    texts = [f"question {number}" for number in range(50)]
+    engine = EmbeddingEngine(index=HNSWIndex())
+    engine.build(texts)
+    path = str(tmp_path / "index.npz")
+    engine.index.save(path)
+    
+    loaded = HNSWIndex.load(path)
+    links = loaded._links
+    engine = EmbeddingEngine(index=loaded)
+    engine.build(texts)
+    assert engine.index._links is links
+    engine.build(texts[:-1])
+    assert engine.index.size == len(texts) - 1
+
+
+def test_ivf_probes_only_the_closest_lists():
+    vectors = unit_vectors(400)
+    index = IVFIndex(nlist=8, nprobe=1)
+    index.train(vectors[:200])
+    index.add(vectors)
+    for query in unit_vectors(20, seed=1):
+        closest = int(np.argmax(query @ index.centroids.T - 0.5 * (index.centroids ** 2).sum(axis=1)))
+        members = sorted(index._lists[closest])
+        expected = [members[position] for position in exact_top_k(vectors[members], query, 10)]
+        assert [node for node, _ in index.search(query, 10)] == expected
+
+
+def test_ivf_index_waits_for_min_train_vectors():
+    vectors = unit_vectors(300)
+    index = IVFIndex(nlist=8, nprobe=1, min_train=100)
+    index.add(vectors[:50])
+    # Untrained, the index scans every vector
+    assert index.centroids is None
+    for query in unit_vectors(5, seed=1):
+        assert [node for node, _ in index.search(query, 10)] == exact_top_k(vectors[:50], query, 10)
+    index.add(vectors[50:])
+    assert index.auto_trained
+    np.testing.assert_array_equal(index.centroids, kmeans(vectors, 8)[0])
+    
+    # Centroids learned from the stored vectors go with them, trained ones stay
+    index.clear()
+    assert index.centroids is None and not index.auto_trained
+    index.train(vectors)
+    index.clear()
+    index.add(vectors[:10])
+    assert index.centroids is not None and sum(len(members) for members in index._lists) == 10
+
+
+def test_ivf_index_trains_on_the_chatbot_preprocessing(tmp_path):
+    import main
+    from engines import EmbeddingEngine
+    
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    qa_path = os.path.join(root, "komodo_qa_data.json")
+    with open(qa_path, 'r', encoding='utf-8') as file:
+        qa_data = json.load(file)
+    chatbot = main.KomodoTourChatbot(qa_data, engine=EmbeddingEngine(index=IVFIndex(nlist=4, min_train=1000)),
+                                     synonyms=os.path.join(root, "synonyms.json"))
+    index = chatbot.engine.index
+    chatbot.engine.train_index_from_file(qa_path, chatbot.preprocess_text)
+    # The training questions are the indexed ones, synonyms canonicalized
+    np.testing.assert_array_equal(index.centroids, kmeans(index.vectors, 4)[0])
+    assert not index.auto_trained
+
+
+def test_int8_scores_stay_within_the_quantization_error():
+    vectors = unit_vectors(300)
+    index = Int8Index()
+    index.train(vectors)
+    index.add(vectors)
+    for query in unit_vectors(20, seed=1):
+        # Every value is off by at most half a quantization step
+        bound = float((np.abs(query) * index.scale).sum()) / 2 + 1e-5
+        assert np.abs(index.scores(query) - vectors @ query).max() <= bound
+
+
+def test_int8_index_waits_for_min_train_vectors():
+    vectors = unit_vectors(300)
+    index = Int8Index(min_train=200)
+    index.add(vectors[:100])
+    # Untrained, the index scores the float32 vectors exactly
+    assert index.scale is None
+    np.testing.assert_array_equal(index.scores(vectors[0]), vectors[:100] @ vectors[0])
+    index.add(vectors[100:])
+    assert index.auto_trained and index.scale is not None
+    trained = Int8Index()
+    trained.train(vectors)
+    np.testing.assert_array_equal(index.scale, trained.scale)
+    
+    # Ranges learned from the stored vectors go with them
+    index.clear()
+    assert index.scale is None and not index.auto_trained
+    index.train(vectors)
+    index.clear()
+    assert index.scale is not None
+    index.add(vectors[:10])
+    assert index._raw is None and index.size == 10
+
+
+def test_pq_scores_are_inner_products_with_the_reconstructions():
+    vectors = unit_vectors(300)
+    index = PQIndex(m=4, ks=16)
+    index.train(vectors)
+    index.add(vectors)
+    assert index._codes.shape == (300, 4)
+    for query in unit_vectors(20, seed=1):
+        np.testing.assert_allclose(index.scores(query), index.vectors @ query, atol=1e-5)
+
+
+def test_pq_index_trains_on_at_least_ks_vectors():
+    vectors = unit_vectors(300)
+    index = PQIndex(m=4, ks=64, min_train=10)
+    assert index.min_train == 64
+    index.add(vectors[:50])
+    assert index.codebooks is None
+    np.testing.assert_array_equal(index.scores(vectors[0]), vectors[:50] @ vectors[0])
+    index.add(vectors[50:])
+    assert index.auto_trained and index._codes.shape == (300, 4)
+    
+    # Codebooks learned from the stored vectors go with them, trained ones stay
+    index.clear()
+    assert index.codebooks is None
+    index.train(vectors)
+    index.clear()
+    index.add(vectors[:10])
+    assert index.codebooks is not None and index._raw is None
+
+
+@pytest.mark.parametrize("make_index", [Int8Index, lambda: PQIndex(m=4, ks=16)])
+def test_quantized_indexes_deploy_trained_parameters(make_index, tmp_path):
+    vectors = unit_vectors(300)
+    index = make_index()
+    index.train(vectors)
+    path = str(tmp_path / "index.npz")
+    index.save(path)
+    
+    loaded = type(index).load(path)
+    assert loaded.trained and not loaded.auto_trained and loaded.size == 0
+    loaded.add(vectors[:10])
+    index.add(vectors[:10])
+    np.testing.assert_array_equal(loaded.vectors, index.vectors)
+    loaded.clear()
+    assert loaded.trained
+
+
+@pytest.mark.parametrize("make_index", [lambda: Int8Index(rescore=10), lambda: PQIndex(m=4, ks=16, rescore=10)])
+def test_rescored_results_carry_exact_scores(make_index):
+    from engines import EmbeddingEngine
+    
+    texts = [f"question {number} about komodo" for number in range(300)]
+    engine = EmbeddingEngine(index=make_index())
+    engine.build(texts)
+    vectors = engine.encoder.encode(texts)
+    for query in ("question 7", "komodo", "question 123 about"):
+        query_vector = engine.encoder.encode([query])[0]
+        for node, score in engine.search(query, 5):
+            assert score == pytest.approx(min(float(vectors[node] @ query_vector), 1.0), abs=1e-5)
+
+
+@pytest.mark.parametrize("make_index", [lambda: Int8Index(rescore=400), lambda: PQIndex(m=4, ks=16, rescore=400)])
+def test_rescoring_every_vector_is_exact(make_index):
+    vectors = unit_vectors(300)
+    index = make_index()
+    index.vector_source = lambda ids: vectors[ids]
+    index.train(vectors)
+    index.add(vectors)
+    for query in unit_vectors(20, seed=1):
+        # Includes vectors whose approximate score is not positive
+        assert [node for node, _ in index.search(query, 300)] == exact_top_k(vectors, query, 300)
@@ -0,0 +1,32 @@
+"""
+Text normalization shared by the chatbot and its retrieval engines.
+"""
+
+import re
+
+
+# Words too common in tourist questions to be useful for candidate generation
+STOPWORDS = frozenset("""
+    a about am an and any are as at be been by can could do does for from have how i
+    if in is it me my of on or our should so the there this to up us was we what
+    when where which who will with would you your
+""".split())
+
+
+def normalize_text(text):
+    """
+    Clean and normalize text for better matching.
+    
+    Args:
+        text (str): Input text to process
+        
+    Returns:
+        str: Processed text
+    """
+    # Convert to lowercase
+    text = text.lower()
+    # Remove punctuation
+    text = re.sub(r'[^\w\s]', '', text)
+    # Remove extra whitespace
+    text = ' '.join(text.split())
+    return text
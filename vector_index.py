@@ -0,0 +1,1000 @@
+"""
+Vector indexes for dense question embeddings.
+
+An index stores L2-normalized float32 vectors under consecutive ids (the question
+indices) and implements add(vectors), search(query, k), clear(), save(path) and the
+classmethod load(path). search returns (index, score) tuples sorted by descending
+inner product, which is the cosine similarity for normalized vectors.
+"""
+
+import heapq
+import math
+import random
+
+try:
+    import numpy as np
+except ImportError:  # only needed once an index is created
+    np = None
+
+
+def top_k_scores(scores, k):
+    """
+    Select the k highest positive scores from a score vector with np.argpartition.
+    
+    Args:
+        scores (numpy.ndarray): One score per stored question
+        k (int): Number of results
+        
+    Returns:
+        list: List of tuples (index, score) sorted by descending score, ties by index
+    """
+    if k <= 0:
+        return []
+    candidates = np.flatnonzero(scores > 0)
+    if len(candidates) > k:
+        # Keep everything tied with the k-th score so ties resolve to the lower index
+        kth = np.partition(scores[candidates], len(candidates) - k)[len(candidates) - k]
+        candidates = candidates[scores[candidates] >= kth]
+    order = np.lexsort((candidates, -scores[candidates]))[:k]
+    selected = candidates[order]
+    # float32 rounding can push a perfect match marginally above 1.0
+    return list(zip(selected.tolist(), np.minimum(scores[selected], 1.0).tolist()))
+
+
+def append_rows(buffer, size, rows):
+    """
+    Copy rows into a preallocated buffer, doubling its capacity when it is full.
+    
+    Args:
+        buffer (numpy.ndarray): Buffer whose first size rows are in use, or None
+        size (int): Number of rows in use
+        rows (numpy.ndarray): Rows to append
+        
+    Returns:
+        numpy.ndarray: The buffer holding size + len(rows) rows (possibly a new array)
+    """
+    needed = size + len(rows)
+    if buffer is None:
+        buffer = np.zeros((max(needed, 1),) + rows.shape[1:], dtype=rows.dtype)
+    elif needed > len(buffer):
+        grown = np.zeros((max(needed, 2 * len(buffer)),) + buffer.shape[1:], dtype=buffer.dtype)
+        grown[:size] = buffer[:size]
+        buffer = grown
+    buffer[size:needed] = rows
+    return buffer
+
+
+class FlatIndex:
+    """
+    Exact search: one dot product with every stored vector.
+    """
+    
+    def __init__(self):
+        """
+        Create an empty index.
+        """
+        if np is None:
+            raise ImportError("FlatIndex requires numpy (pip install numpy)")
+        self.clear()
+    
+    @property
+    def vectors(self):
+        """
+        numpy.ndarray: The stored vectors, one row per id.
+        """
+        if self._vectors is None:
+            return np.zeros((0, 0), dtype=np.float32)
+        return self._vectors[:self.size]
+    
+    def clear(self):
+        """
+        Remove all vectors.
+        """
+        self._vectors = None
+        self.size = 0
+    
+    def add(self, vectors):
+        """
+        Store vectors under the next free ids.
+        
+        Args:
+            vectors (numpy.ndarray): float32 array of shape (n, dimension)
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self._vectors = append_rows(self._vectors, self.size, vectors)
+        self.size += len(vectors)
+    
+    def search(self, query, k):
+        """
+        Find the k stored vectors with the highest inner product.
+        
+        Args:
+            query (numpy.ndarray): Normalized query vector
+            k (int): Number of results
+            
+        Returns:
+            list: List of tuples (index, score) sorted by descending score
+        """
+        if self.size == 0:
+            return []
+        return top_k_scores(self.vectors @ query, k)
+    
+    def save(self, path):
+        """
+        Write the index to a .npy file.
+        
+        Args:
+            path (str): Destination file
+        """
+        with open(path, 'wb') as file:
+            np.save(file, self.vectors)
+    
+    @classmethod
+    def load(cls, path):
+        """
+        Read an index written by save().
+        
+        Args:
+            path (str): Source file
+            
+        Returns:
+            FlatIndex: The loaded index
+        """
+        index = cls()
+        index.add(np.load(path))
+        return index
+
+
+class HNSWIndex:
+    """
+    Hierarchical Navigable Small World graph for approximate nearest-neighbor search.
+    
+    Each vector is linked to up to M neighbors per layer (2 * M on the bottom layer),
+    chosen with the diversity heuristic from the HNSW paper. A search greedily walks
+    down the sparse upper layers and then runs a best-first search on the bottom
+    layer, so it only visits a small part of the graph. ef_construction and
+    ef_search trade build and query time for recall.
+    """
+    
+    def __init__(self, M=16, ef_construction=100, ef_search=50, seed=0):
+        """
+        Create an empty index.
+        
+        Args:
+            M (int): Number of links per node and layer
+            ef_construction (int): Candidate list size while inserting
+            ef_search (int): Candidate list size while searching (at least k)
+            seed (int): Seed for the random layer assignment
+        """
+        if np is None:
+            raise ImportError("HNSWIndex requires numpy (pip install numpy)")
+        self.M = M
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.seed = seed
+        self.clear()
+    
+    @property
+    def vectors(self):
+        """
+        numpy.ndarray: The stored vectors, one row per id.
+        """
+        if self._vectors is None:
+            return np.zeros((0, 0), dtype=np.float32)
+        return self._vectors[:self.size]
+    
+    def clear(self):
+        """
+        Remove all vectors and links.
+        """
+        self._vectors = None
+        self.size = 0
+        # node -> one list of neighbor ids per layer the node lives on
+        self._links = []
+        self._entry_point = None
+        self._max_level = -1
+        self._random = random.Random(self.seed)
+    
+    def _search_layer(self, query, entry_points, ef, level):
+        """
+        Best-first search on one layer.
+        
+        Returns:
+            list: Up to ef tuples (similarity, id), most similar first
+        """
+        visited = set(entry_points)
+        similarities = (self._vectors[entry_points] @ query).tolist()
+        candidates = [(-similarity, node) for similarity, node in zip(similarities, entry_points)]
+        heapq.heapify(candidates)
+        results = sorted(zip(similarities, entry_points))[-ef:]
+        heapq.heapify(results)
+        
+        while candidates:
+            negative_similarity, node = heapq.heappop(candidates)
+            if len(results) >= ef and -negative_similarity < results[0][0]:
+                break
+            neighbors = [neighbor for neighbor in self._links[node][level] if neighbor not in visited]
+            if not neighbors:
+                continue
+            visited.update(neighbors)
+            for neighbor, similarity in zip(neighbors, (self._vectors[neighbors] @ query).tolist()):
+                if len(results) < ef or similarity > results[0][0]:
+                    heapq.heappush(candidates, (-similarity, neighbor))
+                    heapq.heappush(results, (similarity, neighbor))
+                    if len(results) > ef:
+                        heapq.heappop(results)
+        return sorted(results, reverse=True)
+    
+    def _select_neighbors(self, candidates, limit):
+        """
+        Pick up to limit diverse neighbors from (similarity, id) candidates, best first.
+        
+        A candidate is preferred if it is closer to the base vector than to every
+        neighbor picked so far; the remaining slots are filled with the best of the
+        skipped candidates to keep the graph well connected.
+        """
+        selected = []
+        skipped = []
+        for similarity, node in candidates:
+            if len(selected) >= limit:
+                break
+            if selected and (self._vectors[selected] @ self._vectors[node]).max() > similarity:
+                skipped.append(node)
+            else:
+                selected.append(node)
+        return selected + skipped[:limit - len(selected)]
+    
+    def _insert(self, vector):
+        """
+        Link one new vector into the graph.
+        """
+        node = self.size
+        self._vectors = append_rows(self._vectors, self.size, vector[np.newaxis])
+        self.size += 1
+        level = int(-math.log(1.0 - self._random.random()) / math.log(self.M))
+        self._links.append([[] for _ in range(level + 1)])
+        if self._entry_point is None:
+            self._entry_point = node
+            self._max_level = level
+            return
+        
+        entry_points = [self._entry_point]
+        for current in range(self._max_level, level, -1):
+            entry_points = [self._search_layer(vector, entry_points, 1, current)[0][1]]
+        
+        for current in range(min(level, self._max_level), -1, -1):
+            found = self._search_layer(vector, entry_points, self.ef_construction, current)
+            limit = 2 * self.M if current == 0 else self.M
+            self._links[node][current] = self._select_neighbors(found, self.M)
+            for neighbor in self._links[node][current]:
+                links = self._links[neighbor][current]
+                links.append(node)
+                if len(links) > limit:
+                    similarities = (self._vectors[links] @ self._vectors[neighbor]).tolist()
+                    ranked = sorted(zip(similarities, links), reverse=True)
+                    self._links[neighbor][current] = self._select_neighbors(ranked, limit)
+            entry_points = [candidate for _, candidate in found]
+        
+        if level > self._max_level:
+            self._entry_point = node
+            self._max_level = level
+    
+    def add(self, vectors):
+        """
+        Insert vectors under the next free ids.
+        
+        Args:
+            vectors (numpy.ndarray): float32 array of shape (n, dimension)
+        """
+        for vector in np.asarray(vectors, dtype=np.float32):
+            self._insert(vector)
+    
+    def search(self, query, k):
+        """
+        Find approximately the k stored vectors with the highest inner product.
+        
+        Args:
+            query (numpy.ndarray): Normalized query vector
+            k (int): Number of results
+            
+        Returns:
+            list: List of tuples (index, score) sorted by descending score
+        """
+        if self._entry_point is None:
+            return []
+        query = np.asarray(query, dtype=np.float32)
+        entry_points = [self._entry_point]
+        for current in range(self._max_level, 0, -1):
+            entry_points = [self._search_layer(query, entry_points, 1, current)[0][1]]
+        found = self._search_layer(query, entry_points, max(self.ef_search, k), 0)
+        results = sorted((-similarity, node) for similarity, node in found if similarity > 0)[:k]
+        return [(node, min(-negative_similarity, 1.0)) for negative_similarity, node in results]
+    
+    def save(self, path):
+        """
+        Write the vectors and the graph to a .npz file.
+        
+        Args:
+            path (str): Destination file
+        """
+        levels = [len(node_links) - 1 for node_links in self._links]
+        counts = [len(links) for node_links in self._links for links in node_links]
+        flat_links = [neighbor for node_links in self._links for links in node_links for neighbor in links]
+        entry_point = -1 if self._entry_point is None else self._entry_point
+        with open(path, 'wb') as file:
+            np.savez(
+                file,
+                vectors=self.vectors,
+                levels=np.asarray(levels, dtype=np.int32),
+                counts=np.asarray(counts, dtype=np.int32),
+                links=np.asarray(flat_links, dtype=np.int32),
+                settings=np.asarray([self.M, self.ef_construction, self.ef_search, self.seed,
+                                     entry_point, self._max_level], dtype=np.int64),
+            )
+    
+    @classmethod
+    def load(cls, path):
+        """
+        Read an index written by save().
+        
+        Args:
+            path (str): Source file
+            
+        Returns:
+            HNSWIndex: The loaded index
+        """
+        with np.load(path) as data:
+            M, ef_construction, ef_search, seed, entry_point, max_level = data["settings"].tolist()
+            index = cls(M, ef_construction, ef_search, seed)
+            vectors = data["vectors"]
+            if len(vectors):
+                index._vectors = append_rows(None, 0, vectors)
+                index.size = len(vectors)
+            counts = iter(data["counts"].tolist())
+            links = data["links"].tolist()
+            position = 0
+            for level in data["levels"].tolist():
+                node_links = []
+                for _ in range(level + 1):
+                    count = next(counts)
+                    node_links.append(links[position:position + count])
+                    position += count
+                index._links.append(node_links)
+        index._entry_point = None if entry_point < 0 else entry_point
+        index._max_level = max_level
+        return index
+
+
+class _QuantizedIndex:
+    """
+    Storage, training and search shared by the compressed indexes.
+    
+    A subclass learns its quantization parameters in _learn(), encodes vectors with
+    quantize(), decodes codes with _decode() and scores them with _code_scores().
+    An index that was not trained explicitly keeps float32 vectors, scored exactly,
+    until it holds min_train of them, and then learns its parameters from them.
+    Parameters learned this way are dropped by clear(), so a rebuilt knowledge base
+    is quantized with its own; parameters from train() (e.g. trained offline and
+    loaded) are kept. Optionally the best `rescore` candidates are re-ranked with
+    exact float32 vectors fetched through vector_source, e.g. from an EmbeddingCache
+    memory map or by re-encoding them.
+    """
+    
+    # Constructor arguments saved in the settings array, in this order
+    SETTINGS = ()
+    
+    def __init__(self, rescore, vector_source, min_train):
+        """
+        Set the options shared by every quantized index and empty it.
+        
+        Args:
+            rescore (int): Number of candidates to re-rank in float32, 0 to disable
+            vector_source (callable): Function mapping a list of ids to their float32
+                                      vectors, required for rescoring
+            min_train (int): Number of stored vectors at which an untrained index
+                             learns its parameters from them
+        """
+        self.rescore = rescore
+        self.vector_source = vector_source
+        self.min_train = min_train
+        # Whether the parameters were learned from the stored vectors rather than by train()
+        self.auto_trained = False
+        self.clear()
+    
+    @property
+    def vectors(self):
+        """
+        numpy.ndarray: Decoded (approximate) vectors, one row per id.
+        """
+        if self._raw is not None:
+            return self._raw[:self.size]
+        if self._codes is None:
+            return np.zeros((0, 0), dtype=np.float32)
+        return self._decode(self._codes[:self.size])
+    
+    def clear(self):
+        """
+        Remove all vectors, keeping the parameters learned by train().
+        """
+        self._codes = None
+        # float32 rows stored while the index is untrained
+        self._raw = None
+        self.size = 0
+        if self.auto_trained:
+            self._forget()
+            self.auto_trained = False
+    
+    def train(self, vectors):
+        """
+        Learn the quantization parameters from training vectors.
+        
+        Stored vectors are (re-)encoded with the new parameters, from their decoded
+        approximations if they were already encoded.
+        
+        Args:
+            vectors (numpy.ndarray): Training vectors, e.g. the KB question embeddings
+        """
+        self._fit(vectors)
+        self.auto_trained = False
+    
+    def _fit(self, vectors):
+        """
+        Learn the parameters and encode the stored vectors with them.
+        """
+        stored = self.vectors if self.size else None
+        self._learn(np.asarray(vectors, dtype=np.float32))
+        if stored is not None:
+            self._codes = append_rows(None, 0, self.quantize(stored))
+            self._raw = None
+    
+    def add(self, vectors):
+        """
+        Encode and store vectors under the next free ids.
+        
+        An untrained index keeps them in float32 until it holds min_train vectors.
+        
+        Args:
+            vectors (numpy.ndarray): float32 array of shape (n, dimension)
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not self.trained:
+            self._raw = append_rows(self._raw, self.size, vectors)
+            self.size += len(vectors)
+            if self.size >= self.min_train:
+                self._fit(self.vectors)
+                self.auto_trained = True
+            return
+        self._codes = append_rows(self._codes, self.size, self.quantize(vectors))
+        self.size += len(vectors)
+    
+    def scores(self, query):
+        """
+        Approximate inner products between a query and every stored vector.
+        
+        Args:
+            query (numpy.ndarray): Query vector
+            
+        Returns:
+            numpy.ndarray: float32 scores, one per id
+        """
+        query = np.asarray(query, dtype=np.float32)
+        if self._raw is not None:
+            return self._raw[:self.size] @ query
+        return self._code_scores(query)
+    
+    def search(self, query, k):
+        """
+        Find the k stored vectors with the highest (approximate) inner product.
+        
+        Args:
+            query (numpy.ndarray): Normalized query vector
+            k (int): Number of results
+            
+        Returns:
+            list: List of tuples (index, score) sorted by descending score
+        """
+        if self.size == 0:
+            return []
+        scores = self.scores(query)
+        # Untrained indexes already score the float32 vectors
+        if not self.rescore or self.vector_source is None or self._raw is not None:
+            return top_k_scores(scores, k)
+        
+        # Approximate scores may fall to zero or below for vectors whose exact score is positive
+        count = min(max(k, self.rescore), self.size)
+        candidates = np.argpartition(-scores, count - 1)[:count]
+        exact = np.zeros(self.size, dtype=np.float32)
+        exact[candidates] = np.asarray(self.vector_source(candidates.tolist()), dtype=np.float32) @ query
+        return top_k_scores(exact, k)
+    
+    def save(self, path):
+        """
+        Write the quantization parameters and the stored vectors to a .npz file.
+        
+        Saving right after train() gives a parameter file to deploy; vectors added
+        later are encoded with it.
+        
+        Args:
+            path (str): Destination file
+        """
+        arrays = self._parameter_arrays() if self.trained else {}
+        arrays.update(
+            codes=self._codes[:self.size] if self._codes is not None else np.zeros((0, 0), dtype=np.uint8),
+            raw=self._raw[:self.size] if self._raw is not None else np.zeros((0, 0), dtype=np.float32),
+            settings=np.asarray([getattr(self, name) for name in self.SETTINGS] + [self.auto_trained],
+                                dtype=np.int64),
+        )
+        with open(path, 'wb') as file:
+            np.savez(file, **arrays)
+    
+    @classmethod
+    def load(cls, path, vector_source=None):
+        """
+        Read an index written by save().
+        
+        Args:
+            path (str): Source file
+            vector_source (callable): See __init__
+            
+        Returns:
+            _QuantizedIndex: The loaded index, an instance of the class load() is called on
+        """
+        with np.load(path) as data:
+            settings = data["settings"].tolist()
+            index = cls(vector_source=vector_source, **dict(zip(cls.SETTINGS, settings)))
+            if index._load_parameters(data):
+                index.auto_trained = bool(settings[-1])
+            if data["codes"].size:
+                index._codes = append_rows(None, 0, data["codes"])
+                index.size = len(data["codes"])
+            elif data["raw"].size:
+                index._raw = append_rows(None, 0, data["raw"])
+                index.size = len(data["raw"])
+        return index
+
+
+class Int8Index(_QuantizedIndex):
+    """
+    Exact-search index over int8 scalar-quantized vectors.
+    
+    Every dimension gets its own offset and scale, learned from the value range of
+    the training vectors, so each value is stored in one byte instead of four.
+    Scores are computed directly from the codes: with x ~ offset + scale * code,
+    the inner product is q . offset + (q * scale) . code.
+    """
+    
+    SETTINGS = ("rescore", "min_train")
+    # Rows dequantized per step, so scoring never materializes a full float32 copy
+    CHUNK_SIZE = 8192
+    
+    def __init__(self, rescore=0, vector_source=None, min_train=256):
+        """
+        Create an empty, untrained index.
+        
+        Args:
+            rescore (int): Number of candidates to re-rank in float32, 0 to disable
+            vector_source (callable): Function mapping a list of ids to their float32
+                                      vectors, required for rescoring
+            min_train (int): Number of stored vectors at which an untrained index
+                             learns its ranges from them
+        """
+        if np is None:
+            raise ImportError("Int8Index requires numpy (pip install numpy)")
+        self.offset = None
+        self.scale = None
+        super().__init__(rescore, vector_source, min_train)
+    
+    @property
+    def trained(self):
+        """
+        bool: Whether the offsets and scales are known.
+        """
+        return self.scale is not None
+    
+    def _learn(self, vectors):
+        """
+        Learn the per-dimension offsets and scales from the value range of vectors.
+        """
+        low = vectors.min(axis=0)
+        high = vectors.max(axis=0)
+        self.scale = np.maximum((high - low) / 255.0, 1e-12).astype(np.float32)
+        # Shift by 128 steps so codes use the signed int8 range -128..127
+        self.offset = (low + 128.0 * self.scale).astype(np.float32)
+    
+    def _forget(self):
+        """
+        Drop the learned ranges.
+        """
+        self.offset = None
+        self.scale = None
+    
+    def quantize(self, vectors):
+        """
+        Encode float vectors as int8 codes, clipping values outside the learned range.
+        
+        Args:
+            vectors (numpy.ndarray): float32 array of shape (n, dimension)
+            
+        Returns:
+            numpy.ndarray: int8 array of the same shape
+        """
+        codes = np.rint((np.asarray(vectors, dtype=np.float32) - self.offset) / self.scale)
+        return np.clip(codes, -128, 127).astype(np.int8)
+    
+    def _decode(self, codes):
+        """
+        Dequantize codes to float32 vectors.
+        """
+        return self.offset + self.scale * codes.astype(np.float32)
+    
+    def _code_scores(self, query):
+        """
+        Inner products between a query and every dequantized vector, chunk by chunk.
+        """
+        scaled_query = query * self.scale
+        scores = np.empty(self.size, dtype=np.float32)
+        for start in range(0, self.size, self.CHUNK_SIZE):
+            chunk = self._codes[start:min(start + self.CHUNK_SIZE, self.size)]
+            scores[start:start + len(chunk)] = chunk.astype(np.float32) @ scaled_query
+        return scores + float(query @ self.offset)
+    
+    def _parameter_arrays(self):
+        """
+        Arrays saving the learned ranges.
+        """
+        return {"offset": self.offset, "scale": self.scale}
+    
+    def _load_parameters(self, data):
+        """
+        Restore the ranges saved by _parameter_arrays(), if any.
+        """
+        # Files saved untrained may hold empty ranges
+        if "scale" not in data or not data["scale"].size:
+            return False
+        self.offset = data["offset"]
+        self.scale = data["scale"]
+        return True
+
+
+def kmeans(vectors, k, iterations=20, seed=0):
+    """
+    Cluster vectors with Lloyd's k-means and k-means++ seeding.
+    
+    Args:
+        vectors (numpy.ndarray): float32 array of shape (n, dimension)
+        k (int): Number of clusters (at most n)
+        iterations (int): Maximum number of Lloyd iterations
+        seed (int): Seed for the initialization
+        
+    Returns:
+        tuple: (centroids, assignments) as float32 (k, dimension) and int (n,) arrays
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    k = min(k, len(vectors))
+    
+    centroids = np.empty((k, vectors.shape[1]), dtype=np.float32)
+    centroids[0] = vectors[rng.integers(len(vectors))]
+    distances = ((vectors - centroids[0]) ** 2).sum(axis=1)
+    for cluster in range(1, k):
+        total = distances.sum()
+        choice = rng.choice(len(vectors), p=distances / total) if total > 0 else rng.integers(len(vectors))
+        centroids[cluster] = vectors[choice]
+        distances = np.minimum(distances, ((vectors - centroids[cluster]) ** 2).sum(axis=1))
+    
+    assignments = None
+    for _ in range(iterations):
+        # argmin of the squared distance without materializing the (n, k, dimension) differences
+        new_assignments = np.argmax(vectors @ centroids.T - 0.5 * (centroids ** 2).sum(axis=1), axis=1)
+        if assignments is not None and np.array_equal(assignments, new_assignments):
+            break
+        assignments = new_assignments
+        for cluster in range(k):
+            members = vectors[assignments == cluster]
+            if len(members):
+                centroids[cluster] = members.mean(axis=0)
+    return centroids, assignments
+
+
+class IVFIndex:
+    """
+    Inverted-file index: vectors are partitioned by their nearest k-means centroid.
+    
+    A search ranks the centroids and only scores the vectors in the nprobe closest
+    lists, so nprobe is the recall-versus-latency knob (nprobe == nlist is exact).
+    An index that was not trained explicitly scores every vector until it holds
+    min_train of them, and then trains its centroids on them; such centroids are
+    dropped by clear(), so a rebuilt knowledge base gets its own. Centroids from
+    train() (e.g. trained offline and loaded) are kept.
+    """
+    
+    def __init__(self, nlist=64, nprobe=4, seed=0, min_train=None):
+        """
+        Create an empty, untrained index.
+        
+        Args:
+            nlist (int): Number of k-means centroids (inverted lists)
+            nprobe (int): Number of lists scored per query
+            seed (int): Seed for the k-means initialization
+            min_train (int): Number of stored vectors at which an untrained index
+                             trains its centroids on them; never less than nlist
+        """
+        if np is None:
+            raise ImportError("IVFIndex requires numpy (pip install numpy)")
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.seed = seed
+        self.min_train = max(min_train or 0, nlist)
+        self.centroids = None
+        # Whether the centroids were learned from the stored vectors rather than by train()
+        self.auto_trained = False
+        self.clear()
+    
+    @property
+    def vectors(self):
+        """
+        numpy.ndarray: The stored vectors, one row per id.
+        """
+        if self._vectors is None:
+            return np.zeros((0, 0), dtype=np.float32)
+        return self._vectors[:self.size]
+    
+    def clear(self):
+        """
+        Remove all vectors, keeping the centroids learned by train().
+        """
+        self._vectors = None
+        self.size = 0
+        if self.auto_trained:
+            self.centroids = None
+            self.auto_trained = False
+        self._lists = [[] for _ in range(len(self.centroids))] if self.centroids is not None else []
+        # cluster -> list ids as an array, dropped whenever the list grows
+        self._list_arrays = {}
+    
+    def train(self, vectors):
+        """
+        Learn the centroids and reassign every stored vector to its list.
+        
+        Args:
+            vectors (numpy.ndarray): Training vectors, e.g. the KB question embeddings
+        """
+        self.centroids, _ = kmeans(vectors, self.nlist, seed=self.seed)
+        self.auto_trained = False
+        self._lists = [[] for _ in range(len(self.centroids))]
+        self._list_arrays = {}
+        if self.size:
+            self._assign(0, self.vectors)
+    
+    def _assign(self, first_id, vectors):
+        """
+        Append ids to the list of their nearest centroid.
+        """
+        nearest = np.argmax(vectors @ self.centroids.T - 0.5 * (self.centroids ** 2).sum(axis=1), axis=1)
+        for offset, cluster in enumerate(nearest.tolist()):
+            self._lists[cluster].append(first_id + offset)
+            self._list_arrays.pop(cluster, None)
+    
+    def _list_array(self, cluster):
+        """
+        Ids of one inverted list as an int64 array.
+        """
+        members = self._list_arrays.get(cluster)
+        if members is None:
+            members = self._list_arrays[cluster] = np.asarray(self._lists[cluster], dtype=np.int64)
+        return members
+    
+    def add(self, vectors):
+        """
+        Store vectors under the next free ids.
+        
+        An untrained index trains its centroids once it holds min_train vectors.
+        
+        Args:
+            vectors (numpy.ndarray): float32 array of shape (n, dimension)
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        first_id = self.size
+        self._vectors = append_rows(self._vectors, self.size, vectors)
+        self.size += len(vectors)
+        if self.centroids is not None:
+            self._assign(first_id, vectors)
+        elif self.size >= self.min_train:
+            self.train(self.vectors)
+            self.auto_trained = True
+    
+    def search(self, query, k):
+        """
+        Find approximately the k stored vectors with the highest inner product.
+        
+        Args:
+            query (numpy.ndarray): Normalized query vector
+            k (int): Number of results
+            
+        Returns:
+            list: List of tuples (index, score) sorted by descending score
+        """
+        if self.size == 0:
+            return []
+        if self.centroids is None:
+            # Too few vectors to train on, so the scan is exhaustive
+            return top_k_scores(self.vectors @ query, k)
+        
+        closeness = query @ self.centroids.T - 0.5 * (self.centroids ** 2).sum(axis=1)
+        probes = np.argsort(-closeness)[:self.nprobe].tolist()
+        candidates = np.concatenate([self._list_array(cluster) for cluster in probes])
+        if len(candidates) == 0:
+            return []
+        results = top_k_scores(self._vectors[candidates] @ query, k)
+        return [(int(candidates[position]), score) for position, score in results]
+    
+    def save(self, path):
+        """
+        Write the centroids, vectors and list assignments to a .npz file.
+        
+        Args:
+            path (str): Destination file
+        """
+        assignments = np.full(self.size, -1, dtype=np.int32)
+        for cluster, members in enumerate(self._lists):
+            assignments[members] = cluster
+        with open(path, 'wb') as file:
+            np.savez(
+                file,
+                vectors=self.vectors,
+                centroids=self.centroids if self.centroids is not None else np.zeros((0, 0), dtype=np.float32),
+                assignments=assignments,
+                settings=np.asarray([self.nlist, self.nprobe, self.seed, self.min_train, self.auto_trained],
+                                    dtype=np.int64),
+            )
+    
+    @classmethod
+    def load(cls, path):
+        """
+        Read an index written by save().
+        
+        Args:
+            path (str): Source file
+            
+        Returns:
+            IVFIndex: The loaded index
+        """
+        with np.load(path) as data:
+            nlist, nprobe, seed, min_train, auto_trained = data["settings"].tolist()
+            index = cls(nlist, nprobe, seed, min_train)
+            if data["centroids"].size:
+                index.centroids = data["centroids"]
+                index.clear()
+                index.auto_trained = bool(auto_trained)
+            vectors = data["vectors"]
+            if len(vectors):
+                index._vectors = append_rows(None, 0, vectors)
+                index.size = len(vectors)
+            if index.centroids is not None:
+                # Ids were appended in increasing order, so each list stays sorted
+                for member, cluster in enumerate(data["assignments"].tolist()):
+                    index._lists[cluster].append(member)
+        return index
+
+
+class PQIndex(_QuantizedIndex):
+    """
+    Product-quantization index with asymmetric distance computation.
+    
+    The vector dimensions are split into m subspaces and every subspace gets its own
+    k-means codebook of up to 256 centroids, so a stored vector is just m uint8
+    codes. For a query, a lookup table holds the inner product of each query
+    subvector with every centroid of its subspace; the score of a stored vector is
+    the sum of m table lookups, without reconstructing the vector. An untrained
+    index waits for at least ks vectors to train its codebooks on.
+    """
+    
+    SETTINGS = ("m", "ks", "rescore", "seed", "min_train")
+    # Rows scored per step, bounding the temporary arrays of the table lookups
+    CHUNK_SIZE = 65536
+    
+    def __init__(self, m=8, ks=256, rescore=0, vector_source=None, seed=0, min_train=None):
+        """
+        Create an empty, untrained index.
+        
+        Args:
+            m (int): Number of subspaces (bytes per stored vector)
+            ks (int): Centroids per subspace, at most 256
+            rescore (int): Number of candidates to re-rank in float32, 0 to disable
+            vector_source (callable): Function mapping a list of ids to their float32
+                                      vectors, required for rescoring
+            seed (int): Seed for the k-means initialization
+            min_train (int): Number of stored vectors at which an untrained index
+                             trains its codebooks on them; never less than ks
+        """
+        if np is None:
+            raise ImportError("PQIndex requires numpy (pip install numpy)")
+        if not 1 <= ks <= 256:
+            raise ValueError("ks must be between 1 and 256 to fit codes in one byte")
+        self.m = m
+        self.ks = ks
+        self.seed = seed
+        # One (centroids, dimension slice) pair per subspace once trained
+        self.codebooks = None
+        super().__init__(rescore, vector_source, max(min_train or 0, ks))
+    
+    @property
+    def trained(self):
+        """
+        bool: Whether the codebooks are known.
+        """
+        return self.codebooks is not None
+    
+    def _learn(self, vectors):
+        """
+        Learn one k-means codebook per subspace.
+        """
+        bounds = np.linspace(0, vectors.shape[1], min(self.m, vectors.shape[1]) + 1).astype(int)
+        self.codebooks = []
+        for subspace, (start, stop) in enumerate(zip(bounds[:-1], bounds[1:])):
+            centroids, _ = kmeans(vectors[:, start:stop], self.ks, seed=self.seed + subspace)
+            self.codebooks.append((centroids, slice(start, stop)))
+    
+    def _forget(self):
+        """
+        Drop the learned codebooks.
+        """
+        self.codebooks = None
+    
+    def quantize(self, vectors):
+        """
+        Encode vectors as the ids of their nearest centroid in every subspace.
+        
+        Args:
+            vectors (numpy.ndarray): float32 array of shape (n, dimension)
+            
+        Returns:
+            numpy.ndarray: uint8 array of shape (n, number of subspaces)
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        codes = np.empty((len(vectors), len(self.codebooks)), dtype=np.uint8)
+        for subspace, (centroids, dimensions) in enumerate(self.codebooks):
+            closeness = vectors[:, dimensions] @ centroids.T - 0.5 * (centroids ** 2).sum(axis=1)
+            codes[:, subspace] = np.argmax(closeness, axis=1)
+        return codes
+    
+    def _decode(self, codes):
+        """
+        Reconstruct vectors from the centroids their codes point at.
+        """
+        return np.hstack([centroids[codes[:, subspace]]
+                          for subspace, (centroids, _) in enumerate(self.codebooks)])
+    
+    def _code_scores(self, query):
+        """
+        Score every stored vector with the asymmetric distance tables, chunk by chunk.
+        """
+        # Asymmetric distance tables: query subvector . every centroid of its subspace
+        tables = [centroids @ query[dimensions] for centroids, dimensions in self.codebooks]
+        scores = np.zeros(self.size, dtype=np.float32)
+        for start in range(0, self.size, self.CHUNK_SIZE):
+            codes = self._codes[start:min(start + self.CHUNK_SIZE, self.size)]
+            for subspace, table in enumerate(tables):
+                scores[start:start + len(codes)] += table[codes[:, subspace]]
+        return scores
+    
+    def _parameter_arrays(self):
+        """
+        Arrays saving the codebooks and their subspace boundaries.
+        """
+        arrays = {"bounds": np.asarray([dimensions.start for _, dimensions in self.codebooks]
+                                       + [self.codebooks[-1][1].stop], dtype=np.int64)}
+        for subspace, (centroids, _) in enumerate(self.codebooks):
+            arrays[f"codebook_{subspace}"] = centroids
+        return arrays
+    
+    def _load_parameters(self, data):
+        """
+        Restore the codebooks saved by _parameter_arrays(), if any.
+        """
+        if "bounds" not in data:
+            return False
+        bounds = data["bounds"].tolist()
+        self.codebooks = [(data[f"codebook_{subspace}"], slice(start, stop))
+                          for subspace, (start, stop) in enumerate(zip(bounds[:-1], bounds[1:]))]
+        return True